@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'master_config',
@@ -48,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'master_config.middleware.RequestMetricsMiddleware',
+    'master_config.middleware.SyncStreamingMiddleware',
+    'master_config.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -90,9 +94,34 @@ DATABASES = {
         'PASSWORD': os.getenv('PASSWORD'),
         'HOST': os.getenv('HOST'),
         'PORT': os.getenv('PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas as a comma-separated list of host[:port]. Each one becomes a
+# replica_<n> alias that the router sends read-only employee queries to.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    replica_host, _, replica_port = replica.strip().partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'CONN_MAX_AGE': int(os.getenv('DB_REPLICA_CONN_MAX_AGE', DATABASES['default']['CONN_MAX_AGE'])),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['master_config.routers.PrimaryReplicaRouter']
+
+# How long a client reads from the primary after its own import finishes.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 60))
+
+# How long a replica's replay position is trusted before it is checked again.
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 1))
+
 
 
 # Password validation
@@ -131,6 +160,12 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_ROOT = BASE_DIR / 'media'
+
+EXPORT_ARTIFACT_ROOT = MEDIA_ROOT / 'exports'
+
+IMPORT_REJECTS_ROOT = MEDIA_ROOT / 'import_rejects'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -171,4 +206,35 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
     }
-}
\ No newline at end of file
+}
+
+# How long a cached list page may still be served, while one worker
+# rebuilds it in the background, after it stops being fresh.
+CACHE_STALE_SECONDS = int(os.getenv('CACHE_STALE_SECONDS', 5 * 60))
+
+CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', 2))
+
+
+IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', 2))
+
+IMPORT_PARALLELISM = int(os.getenv('IMPORT_PARALLELISM', 4))
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 32 * 1024 * 1024))
+
+# Running jobs touch their updated_at this often; one that hasn't for
+# IMPORT_JOB_STALE_AFTER seconds lost its worker.
+IMPORT_HEARTBEAT_INTERVAL = int(os.getenv('IMPORT_HEARTBEAT_INTERVAL', 30))
+
+IMPORT_JOB_STALE_AFTER = int(os.getenv('IMPORT_JOB_STALE_AFTER', 10 * 60))
+
+EXPORT_ARTIFACT_MAX_AGE = int(os.getenv('EXPORT_ARTIFACT_MAX_AGE', 24 * 60 * 60))
+
+# How far behind the clock a delta export's next watermark is kept, so rows
+# whose transaction commits after the export started are not skipped.
+EXPORT_WATERMARK_LAG = int(os.getenv('EXPORT_WATERMARK_LAG', 60))
+
+# Threads, each with its own database connection, that write the shards of
+# a sharded export-csv-v3 request. Each one keeps a database core busy.
+EXPORT_SHARD_WORKERS = int(os.getenv('EXPORT_SHARD_WORKERS', 4))
+
+EXPORT_MAX_SHARDS = int(os.getenv('EXPORT_MAX_SHARDS', 64))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MasterConfigConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'master_config'
+
+    def ready(self):
+        from master_config import signals  # noqa: F401
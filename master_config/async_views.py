@@ -0,0 +1,207 @@
+import csv
+import io
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from master_config.caching import acache_get_or_build, build_cache_key
+from master_config.compression import compress_response, negotiate_encoding
+from master_config.counting import CountedPaginator, count_employees
+from master_config.dimensions import departments, positions
+from master_config.export_artifacts import artifact_path, artifact_response, store_artifact
+from master_config.export_csv_v3 import EXPORT_COLUMNS
+from master_config.filters import afilter_employees
+from master_config.metrics import count_streamed_rows
+from master_config.models import Employee
+from master_config.renderers import ORJSONRenderer, render_json
+from master_config.views import (
+    CustomEmployeePagination, EmployeeCursorPagination, EmployeeListAPIView, employee_values, field_names,
+    list_fields, only_fields,
+)
+from master_config.watermarks import apply_delta, delta_since, delta_until, with_watermark
+
+
+EXPORT_BATCH_ROWS = 2000
+
+EXPORT_ID_FIELDS = {
+    'department__name': 'department_id',
+    'position__title': 'position_id',
+}
+
+# Department and position names come from the in-process lookups; the rows
+# only carry the ids.
+EXPORT_FIELDS = [EXPORT_ID_FIELDS.get(field, field) for field, _ in EXPORT_COLUMNS]
+
+
+def error_response(detail, status):
+    return JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=status)
+
+
+class AsyncEmployeeListView(View):
+    """
+    Async counterpart of ``EmployeeListAPIView`` with the same filters,
+    pagination modes and response body. Rows are read with the async ORM.
+    """
+    cache_timeout = EmployeeListAPIView.cache_timeout
+
+    async def get(self, request):
+        request = Request(request)
+        query_params = request.query_params
+        try:
+            fields = list_fields(query_params)
+        except ValidationError as e:
+            return error_response(e.detail, 400)
+
+        cache_key = await sync_to_async(build_cache_key)('employee_list_async_body', query_params)
+        try:
+            body = await acache_get_or_build(
+                cache_key, partial(self.render_page, request, fields), self.cache_timeout
+            )
+        except NotFound as e:
+            return error_response(e.detail, 404)
+
+        return HttpResponse(body, content_type=ORJSONRenderer.media_type)
+
+    async def render_page(self, request, fields):
+        queryset = await afilter_employees(employee_values(fields), request.query_params)
+        queryset = queryset.order_by('-date_of_joining')
+        names = await sync_to_async(field_names)(fields)
+
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            response_data = await self.cursor_page(queryset, request, fields, names)
+        else:
+            response_data = await self.number_page(queryset, request, fields, names)
+        return render_json(response_data)
+
+    async def cursor_page(self, queryset, request, fields, names):
+        paginator = EmployeeCursorPagination()
+        queryset = paginator.page_queryset(queryset, request)
+        paginator.set_page([row async for row in queryset])
+        return paginator.get_paginated_response(only_fields(paginator.page, fields, names)).data
+
+    async def number_page(self, queryset, request, fields, names):
+        pagination = CustomEmployeePagination()
+        page_size = pagination.get_page_size(request)
+        count, is_estimate = await sync_to_async(count_employees)(queryset, request.query_params)
+        paginator = CountedPaginator(queryset, page_size, count=count, is_estimate=is_estimate)
+
+        page_number = request.query_params.get(pagination.page_query_param) or 1
+        if page_number in pagination.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            number = paginator.validate_number(page_number)
+            bottom = (number - 1) * page_size
+            rows = [row async for row in queryset[bottom:bottom + page_size + 1]]
+            if not rows and number > 1:
+                raise InvalidPage()
+        except InvalidPage:
+            raise NotFound(pagination.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+
+        if is_estimate:
+            has_next = len(rows) > page_size
+        else:
+            has_next = number < paginator.num_pages
+        rows = rows[:page_size]
+
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, pagination.page_query_param, number + 1) if has_next else None
+        if number <= 1:
+            previous_link = None
+        elif number == 2:
+            previous_link = remove_query_param(url, pagination.page_query_param)
+        else:
+            previous_link = replace_query_param(url, pagination.page_query_param, number - 1)
+
+        return {
+            'links': {
+                'next': next_link,
+                'previous': previous_link
+            },
+            'count': count,
+            'count_is_estimate': is_estimate,
+            'total_pages': paginator.num_pages,
+            'current_page': number,
+            'results': only_fields(rows, fields, names)
+        }
+
+
+def export_values(queryset):
+    # values() rather than values_list(): the latter runs its query as soon
+    # as aiterator() asks for the iterator, i.e. on the event loop.
+    return queryset.values(*EXPORT_FIELDS)
+
+
+async def stream_rows(queryset, names):
+    """CSV body built from async ORM batches rather than one row per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([label for _, label in EXPORT_COLUMNS])
+
+    lookups = [names.get(field) for field, _ in EXPORT_COLUMNS]
+    rows = 0
+    async for row in export_values(queryset).aiterator(chunk_size=EXPORT_BATCH_ROWS):
+        writer.writerow([
+            row[field] if lookup is None else lookup.get(row[field])
+            for field, lookup in zip(EXPORT_FIELDS, lookups)
+        ])
+        rows += 1
+        if rows % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def export_names():
+    return {'department__name': departments.names(), 'position__title': positions.names()}
+
+
+class AsyncEmployeeExportView(View):
+    """
+    Async CSV export. While waiting on a slow client the download holds no
+    worker thread, only a coroutine on the event loop.
+    """
+
+    async def get(self, request):
+        request = Request(request)
+        try:
+            negotiate_encoding(request)
+        except ValidationError as e:
+            return error_response(e.detail, 400)
+
+        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+        try:
+            since = delta_since(request.query_params)
+        except ValidationError as e:
+            return error_response(e.detail, 400)
+        if since is not None:
+            until = await sync_to_async(delta_until)()
+            queryset = await afilter_employees(Employee.objects.all(), request.query_params)
+            names = await sync_to_async(export_names)()
+            response = self.export_response(apply_delta(queryset, since, until), filename, names)
+            return compress_response(request, count_streamed_rows(with_watermark(response, since, until)))
+
+        path = await sync_to_async(artifact_path)('export_csv_async', request.query_params)
+
+        response = await sync_to_async(artifact_response)(request, path, filename, asynchronous=True)
+        if response is None:
+            queryset = await afilter_employees(Employee.objects.all(), request.query_params)
+            queryset = queryset.order_by('-date_of_joining')
+
+            names = await sync_to_async(export_names)()
+            response = store_artifact(self.export_response(queryset, filename, names), path)
+
+        return compress_response(request, count_streamed_rows(response))
+
+    def export_response(self, queryset, filename, names):
+        response = StreamingHttpResponse(stream_rows(queryset, names), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from master_config.metrics import current_metrics, record_cache_lookup
+from master_config.routers import record_write_position
+
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_KEY = 'employee_data_version'
+
+# How long one worker may hold a rebuild before another is allowed to try.
+BUILD_LOCK_TIMEOUT = 30
+# How long a request without a stale value waits for another worker's build.
+BUILD_WAIT_TIMEOUT = 5
+BUILD_POLL_INTERVAL = 0.05
+
+CachedEntry = namedtuple('CachedEntry', ['fresh_until', 'value'])
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.CACHE_REFRESH_WORKERS, thread_name_prefix='cache-refresh'
+)
+_refresh_tasks = set()
+
+
+def get_data_version():
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Seeding from the clock keeps the counter moving forward even if
+        # Redis evicted it, so entries written under an older generation
+        # can never be read back.
+        cache.add(DATA_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    record_write_position()
+    get_data_version()
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        return get_data_version()
+
+
+def cache_get(key):
+    """``cache.get`` that counts the lookup towards the request's metrics."""
+    value = cache.get(key)
+    record_cache_lookup(value is not None)
+    return value
+
+
+def lookup_entry(key):
+    entry = cache.get(key)
+    # Anything else was written before entries carried a freshness deadline.
+    return entry if isinstance(entry, CachedEntry) else None
+
+
+def store_entry(key, value, timeout):
+    stale = settings.CACHE_STALE_SECONDS
+    cache.set(key, CachedEntry(time.time() + timeout, value), timeout + stale)
+    return value
+
+
+def acquire_build_lock(key):
+    token = uuid.uuid4().hex
+    return token if cache.add(f'{key}:lock', token, BUILD_LOCK_TIMEOUT) else None
+
+
+def release_build_lock(key, token):
+    # Don't release a lock that expired and was taken by another worker.
+    if cache.get(f'{key}:lock') == token:
+        cache.delete(f'{key}:lock')
+
+
+def refresh_entry(key, build, timeout, token):
+    # The copied context keeps the request's replica routing; the
+    # request's metrics were recorded already.
+    current_metrics.set(None)
+    try:
+        store_entry(key, build(), timeout)
+    except Exception:
+        logger.exception('Refreshing cache entry %s failed', key)
+    finally:
+        release_build_lock(key, token)
+        connections.close_all()
+
+
+def cache_get_or_build(key, build, timeout):
+    """
+    Cached ``build()``, computed by one worker at a time.
+
+    For ``timeout`` seconds the value is fresh. For ``CACHE_STALE_SECONDS``
+    after that it is still returned while a background thread rebuilds it.
+    On a miss, the worker that takes the lock builds the value; others wait
+    for it rather than all running the same queries.
+    """
+    entry = lookup_entry(key)
+    record_cache_lookup(entry is not None)
+    if entry is not None:
+        if entry.fresh_until <= time.time():
+            token = acquire_build_lock(key)
+            if token is not None:
+                context = contextvars.copy_context()
+                _refresh_executor.submit(context.run, refresh_entry, key, build, timeout, token)
+        return entry.value
+
+    token = acquire_build_lock(key)
+    if token is None:
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(BUILD_POLL_INTERVAL)
+            entry = lookup_entry(key)
+            if entry is not None:
+                return entry.value
+        # The builder is taking too long or died; build a copy ourselves.
+        return store_entry(key, build(), timeout)
+
+    try:
+        return store_entry(key, build(), timeout)
+    finally:
+        release_build_lock(key, token)
+
+
+async def alookup_entry(key):
+    entry = await cache.aget(key)
+    return entry if isinstance(entry, CachedEntry) else None
+
+
+async def astore_entry(key, value, timeout):
+    stale = settings.CACHE_STALE_SECONDS
+    await cache.aset(key, CachedEntry(time.time() + timeout, value), timeout + stale)
+    return value
+
+
+async def aacquire_build_lock(key):
+    token = uuid.uuid4().hex
+    return token if await cache.aadd(f'{key}:lock', token, BUILD_LOCK_TIMEOUT) else None
+
+
+async def arelease_build_lock(key, token):
+    if await cache.aget(f'{key}:lock') == token:
+        await cache.adelete(f'{key}:lock')
+
+
+async def arefresh_entry(key, abuild, timeout, token):
+    current_metrics.set(None)
+    try:
+        await astore_entry(key, await abuild(), timeout)
+    except Exception:
+        logger.exception('Refreshing cache entry %s failed', key)
+    finally:
+        await arelease_build_lock(key, token)
+
+
+async def acache_get_or_build(key, abuild, timeout):
+    """``cache_get_or_build`` for a coroutine function; refreshes run as tasks."""
+    entry = await alookup_entry(key)
+    record_cache_lookup(entry is not None)
+    if entry is not None:
+        if entry.fresh_until <= time.time():
+            token = await aacquire_build_lock(key)
+            if token is not None:
+                task = asyncio.create_task(arefresh_entry(key, abuild, timeout, token))
+                # The loop only keeps weak references to tasks.
+                _refresh_tasks.add(task)
+                task.add_done_callback(_refresh_tasks.discard)
+        return entry.value
+
+    token = await aacquire_build_lock(key)
+    if token is None:
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(BUILD_POLL_INTERVAL)
+            entry = await alookup_entry(key)
+            if entry is not None:
+                return entry.value
+        return await astore_entry(key, await abuild(), timeout)
+
+    try:
+        return await astore_entry(key, await abuild(), timeout)
+    finally:
+        await arelease_build_lock(key, token)
+
+
+def normalize_params(query_params, exclude=()):
+    items = []
+    for key in sorted(query_params.keys()):
+        if key in exclude:
+            continue
+        values = sorted(value for value in query_params.getlist(key) if value != '')
+        items.extend((key, value) for value in values)
+    return urlencode(items)
+
+
+def params_digest(query_params, exclude=()):
+    return hashlib.md5(normalize_params(query_params, exclude).encode('utf-8')).hexdigest()
+
+
+def build_cache_key(prefix, query_params, exclude=()):
+    return f"{prefix}:{get_data_version()}:{params_digest(query_params, exclude)}"
@@ -0,0 +1,122 @@
+import zlib
+
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import ValidationError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def available_encodings():
+    """Supported encodings in order of preference."""
+    return ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate_encoding(request):
+    """
+    Picks the response encoding from ``?compression=`` or, failing that,
+    ``Accept-Encoding``. Returns ``None`` for an uncompressed response.
+    """
+    requested = request.query_params.get('compression')
+    if requested:
+        requested = requested.lower()
+        if requested in ('none', 'identity'):
+            return None
+        if requested not in available_encodings():
+            raise ValidationError({
+                'compression': f'Unsupported compression: {requested}. '
+                               f'Expected one of: none, {", ".join(available_encodings())}'
+            })
+        return requested
+
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    wildcard = accepted.get('*', 0.0)
+    candidates = [
+        (accepted.get(encoding, wildcard), encoding)
+        for encoding in available_encodings()
+        if accepted.get(encoding, wildcard) > 0
+    ]
+    if not candidates:
+        return None
+    # max() keeps the first of equal qualities, i.e. our own preference.
+    return max(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def compressor_for(encoding):
+    if encoding == 'gzip':
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+
+def compress_stream(chunks, encoding):
+    """Compresses a byte stream incrementally, yielding frames as they fill."""
+    compressor = compressor_for(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = compressor_for(encoding)
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(request, response):
+    """Wraps a ``StreamingHttpResponse`` in the negotiated content encoding."""
+    try:
+        encoding = negotiate_encoding(request)
+    except ValidationError:
+        # The response is never sent, so release the artifact file it may
+        # hold open.
+        response.close()
+        raise
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # Partial and empty responses are served as stored.
+    if encoding is None or response.status_code != 200:
+        return response
+
+    compress = acompress_stream if response.is_async else compress_stream
+    response.streaming_content = compress(response.streaming_content, encoding)
+    response['Content-Encoding'] = encoding
+    if response.has_header('Content-Length'):
+        del response['Content-Length']
+    # Byte ranges refer to the stored, uncompressed body.
+    if response.has_header('Accept-Ranges'):
+        del response['Accept-Ranges']
+    if response.has_header('ETag'):
+        response['ETag'] = response['ETag'][:-1] + f'-{encoding}"'
+    return response
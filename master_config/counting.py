@@ -0,0 +1,125 @@
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections, router
+
+from master_config.caching import build_cache_key, cache_get_or_build
+
+
+# Parameters that only pick a page or its columns, not which rows match.
+PAGE_PARAMS = ('page', 'page_size', 'pagination', 'cursor', 'exact_count', 'fields')
+
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def is_filtered(query_params):
+    # Mirrors filter_employees: the date range only applies with both ends.
+    return bool(
+        query_params.get('search') or
+        (query_params.get('start_date') and query_params.get('end_date')) or
+        query_params.get('department') or
+        query_params.get('position')
+    )
+
+
+def wants_exact_count(query_params):
+    value = query_params.get('exact_count')
+    if value is None:
+        return None
+    return value.lower() not in ('false', '0', 'no')
+
+
+def table_estimate(model):
+    """
+    Row count from the catalog as of the last VACUUM/ANALYZE, summed over
+    the partitions if the table is partitioned.
+    """
+    with connections[router.db_for_read(model)].cursor() as cursor:
+        cursor.execute(
+            "SELECT sum(greatest(reltuples, 0))::bigint, bool_and(reltuples < 0) FROM pg_class "
+            "WHERE (oid = %s::regclass AND relkind = 'r') "
+            "OR oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)",
+            [model._meta.db_table, model._meta.db_table]
+        )
+        estimate, unanalyzed = cursor.fetchone()
+    # reltuples is -1 until a table has been analyzed at least once.
+    if estimate is None or unanalyzed:
+        return None
+    return estimate
+
+
+def planner_estimate(queryset):
+    """Row count the planner expects the query to return."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, query_params):
+    cache_key = build_cache_key('employee_count', query_params, exclude=PAGE_PARAMS)
+    return cache_get_or_build(cache_key, queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+def count_employees(queryset, query_params):
+    """
+    Returns ``(count, is_estimate)``. Unfiltered listings use the catalog
+    estimate and filtered ones an exact count cached per data version,
+    unless ``exact_count`` asks for the other.
+    """
+    exact = wants_exact_count(query_params)
+    if exact is None:
+        exact = is_filtered(query_params)
+
+    if not exact:
+        if is_filtered(query_params):
+            return planner_estimate(queryset), True
+        estimate = table_estimate(queryset.model)
+        if estimate is not None:
+            return estimate, True
+
+    return cached_count(queryset, query_params), False
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator that takes its count from the caller. An estimated count is
+    only reported, never used to cut pages short: each page reads one extra
+    row to find out whether another page follows.
+    """
+
+    def __init__(self, object_list, per_page, count, is_estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+        self.is_estimate = is_estimate
+
+    def validate_number(self, number):
+        if not self.is_estimate:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if not self.is_estimate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
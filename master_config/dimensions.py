@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from master_config.models import Department, Position
+
+
+DIMENSION_VERSION_KEY = 'dimension_version'
+
+Lookup = namedtuple('Lookup', ['names', 'ids'])
+
+
+def get_dimension_version():
+    version = cache.get(DIMENSION_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock for the same reason as the data version.
+        cache.add(DIMENSION_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(DIMENSION_VERSION_KEY)
+    return version
+
+
+def increment_dimension_version():
+    get_dimension_version()
+    try:
+        cache.incr(DIMENSION_VERSION_KEY)
+    except ValueError:
+        get_dimension_version()
+
+
+def bump_dimension_version():
+    """Makes every process reload departments and positions on next use."""
+    # After the commit: a process reloading before it would cache the old
+    # rows under the new version. Runs at once outside a transaction.
+    transaction.on_commit(increment_dimension_version)
+
+
+class Dimension:
+    """
+    Process-local id <-> name lookup for a small table, loaded on first use
+    and reloaded whenever the shared dimension version moves. Every lookup
+    costs one cache read; the table is only read again after a change.
+    """
+
+    def __init__(self, model, name_field):
+        self.model = model
+        self.name_field = name_field
+        self.lock = threading.Lock()
+        self.version = None
+        self.lookup = Lookup({}, {})
+
+    def current(self):
+        version = get_dimension_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    # Always from the primary: a lagging replica would pin
+                    # stale names to the new version.
+                    names = dict(self.model.objects.using('default').values_list('id', self.name_field))
+                    self.lookup = Lookup(names, {name: pk for pk, name in names.items()})
+                    self.version = version
+        return self.lookup
+
+    def names(self):
+        return self.current().names
+
+    def ids(self):
+        return self.current().ids
+
+
+departments = Dimension(Department, 'name')
+positions = Dimension(Position, 'title')
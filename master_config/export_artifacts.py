@@ -0,0 +1,235 @@
+import hashlib
+import os
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from master_config.caching import get_data_version, params_digest
+
+
+ARTIFACT_SUFFIX = '.csv'
+TEMP_SUFFIX = '.tmp'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Parameters that change how a response is delivered, not what it contains.
+DELIVERY_PARAMS = ('compression', 'shards')
+
+
+def artifact_path(prefix, query_params):
+    """Location of the stored export for these filters at the current data version."""
+    digest = params_digest(query_params, exclude=DELIVERY_PARAMS)
+    name = f"{prefix}-{get_data_version()}-{digest}{ARTIFACT_SUFFIX}"
+    return os.path.join(settings.EXPORT_ARTIFACT_ROOT, name)
+
+
+def artifact_version(name):
+    """Data version an artifact file was built for, or ``None`` for foreign files."""
+    if not name.endswith(ARTIFACT_SUFFIX):
+        return None
+    parts = name[:-len(ARTIFACT_SUFFIX)].split('-')
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def artifact_etag(path, stat):
+    token = f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return '"%s"' % hashlib.md5(token.encode('utf-8')).hexdigest()
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    base = etag.strip('"')
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        # Compressed variants carry the encoding as a suffix on the same tag.
+        if candidate == base or candidate.startswith(base + '-'):
+            return True
+    return False
+
+
+def parse_range(header, size):
+    """
+    Parses a single ``bytes=`` range. Returns ``(start, end)`` inclusive,
+    ``None`` when the header should be ignored, or ``False`` when the range
+    cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        return False
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """Read-only view over ``length`` bytes of a file from ``start`` onwards."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+async def aread_file(file, block_size=FileResponse.block_size):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while True:
+            data = await read(block_size)
+            if not data:
+                break
+            yield data
+    finally:
+        file.close()
+
+
+def artifact_body(file, filename, status=200, asynchronous=False):
+    if not asynchronous:
+        return FileResponse(file, as_attachment=True, filename=filename, content_type='text/csv', status=status)
+    # FileResponse only iterates synchronously, which an ASGI server would
+    # buffer in full; async views read the file in blocks off the event loop.
+    response = StreamingHttpResponse(aread_file(file), content_type='text/csv', status=status)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def artifact_response(request, path, filename, asynchronous=False):
+    """
+    Serves a stored export with ETag and single-range support. Returns
+    ``None`` when no artifact exists yet for ``path``.
+    """
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    stat = os.fstat(file.fileno())
+    etag = artifact_etag(path, stat)
+
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        file.close()
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = parse_range(range_header, stat.st_size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range is None:
+        response = artifact_body(file, filename, asynchronous=asynchronous)
+        response['Content-Length'] = stat.st_size
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = artifact_body(RangeFile(file, start, length), filename, 206, asynchronous)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def open_temp_artifact(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}{TEMP_SUFFIX}"
+    return temp_path, open(temp_path, 'wb')
+
+
+def discard_temp_artifact(temp_path):
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def tee_to_artifact(chunks, path):
+    """
+    Passes a response body through while writing it to ``path``. The file
+    only appears once the body has been streamed in full, so an aborted
+    download never leaves a truncated artifact behind.
+    """
+    temp_path, artifact = open_temp_artifact(path)
+    completed = False
+    try:
+        with artifact:
+            for chunk in chunks:
+                artifact.write(chunk)
+                yield chunk
+        os.replace(temp_path, path)
+        completed = True
+    finally:
+        if not completed:
+            discard_temp_artifact(temp_path)
+
+
+async def atee_to_artifact(chunks, path):
+    """``tee_to_artifact`` for async bodies; the file work runs off the event loop."""
+    def off_loop(function):
+        return sync_to_async(function, thread_sensitive=False)
+
+    temp_path, artifact = await off_loop(open_temp_artifact)(path)
+    write = off_loop(artifact.write)
+    completed = False
+    try:
+        try:
+            async for chunk in chunks:
+                await write(chunk)
+                yield chunk
+        finally:
+            await off_loop(artifact.close)()
+        await off_loop(os.replace)(temp_path, path)
+        completed = True
+    finally:
+        if not completed:
+            await off_loop(discard_temp_artifact)(temp_path)
+
+
+def store_artifact(response, path):
+    tee = atee_to_artifact if response.is_async else tee_to_artifact
+    response.streaming_content = tee(response.streaming_content, path)
+    return response
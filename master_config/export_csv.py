@@ -1,13 +1,16 @@
 import csv
 from django.http import StreamingHttpResponse
-from django.db.models import F, Q
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from master_config.compression import compress_response
+from master_config.dimensions import departments, positions
+from master_config.export_artifacts import artifact_path, artifact_response, store_artifact
+from master_config.filters import filter_employees
+from master_config.metrics import count_streamed_rows
 from master_config.models import Employee
+from master_config.watermarks import apply_delta, delta_since, delta_until, with_watermark
 
 
 class Echo:
@@ -18,40 +21,20 @@ class Echo:
 class EmployeeExportAPIView(APIView):
     
     def get_queryset(self, request):
-        search_query = request.query_params.get('search', '')
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        department_id = request.query_params.get('department', None)
-        position_id = request.query_params.get('position', None)
-        
-        queryset = Employee.objects.select_related('department', 'position').values(
+        queryset = Employee.objects.values(
             'id', 'first_name', 'last_name', 'email', 'phone_number', 'salary', 'date_of_joining',
-            department_name=F('department__name'),
-            position_title=F('position__title')
+            'department_id', 'position_id'
         )
         
-        if search_query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) | 
-                Q(last_name__icontains=search_query) | 
-                Q(email__icontains=search_query) |
-                Q(department__name__icontains=search_query)
-            )
-        
-        if start_date and end_date:
-            queryset = queryset.filter(date_of_joining__range=[start_date, end_date])
-            
-        if department_id:
-            queryset = queryset.filter(department_id=department_id)
-            
-        if position_id:
-            queryset = queryset.filter(position_id=position_id)
-        
+        queryset = filter_employees(queryset, request.query_params)
+
         return queryset.order_by('-date_of_joining')
     
     def generate_rows(self, queryset):
         yield ['ID', 'First Name', 'Last Name', 'Email', 'Phone Number', 'Salary', 'Date of Joining', 'Department', 'Position']
-        
+        department_names = departments.names()
+        position_names = positions.names()
+
         for employee in queryset.iterator():
             yield [
                 str(employee['id']),
@@ -61,22 +44,33 @@ class EmployeeExportAPIView(APIView):
                 employee['phone_number'],
                 str(employee['salary']),
                 employee['date_of_joining'].strftime('%Y-%m-%d'),
-                employee['department_name'],
-                employee['position_title']
+                department_names.get(employee['department_id']),
+                position_names.get(employee['position_id'])
             ]
     
-    @method_decorator(cache_page(60 * 5))
-    def get(self, request, format=None):
-        queryset = self.get_queryset(request)
+    def export_response(self, queryset, filename):
         pseudo_buffer = Echo()
         writer = csv.writer(pseudo_buffer)
-        
+
         response = StreamingHttpResponse(
             (writer.writerow(row) for row in self.generate_rows(queryset)),
             content_type="text/csv"
         )
-        
-        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
         return response
+
+    def get(self, request, format=None):
+        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+        since = delta_since(request.query_params)
+        if since is not None:
+            until = delta_until()
+            response = self.export_response(apply_delta(self.get_queryset(request), since, until), filename)
+            return compress_response(request, count_streamed_rows(with_watermark(response, since, until)))
+
+        path = artifact_path('export_csv', request.query_params)
+        response = artifact_response(request, path, filename)
+        if response is None:
+            response = store_artifact(self.export_response(self.get_queryset(request), filename), path)
+
+        return compress_response(request, count_streamed_rows(response))
@@ -1,44 +1,46 @@
 import pandas as pd
 from django.http import StreamingHttpResponse
-from django.db.models import Q
 from django.utils import timezone
 from rest_framework.views import APIView
+from master_config.compression import compress_response
+from master_config.dimensions import departments, positions
+from master_config.export_artifacts import artifact_path, artifact_response, store_artifact
+from master_config.filters import filter_employees
+from master_config.metrics import count_streamed_rows
 from master_config.models import Employee
+from master_config.watermarks import apply_delta, delta_since, delta_until, with_watermark
 
 class EmployeeExportAPIViewV2(APIView):
     def get_queryset(self, request):
-        search_query = request.query_params.get('search', '')
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        department_id = request.query_params.get('department', None)
-        position_id = request.query_params.get('position', None)
-
-        queryset = Employee.objects.select_related('department', 'position').only(
+        queryset = Employee.objects.only(
             'id', 'first_name', 'last_name', 'email', 'phone_number', 'salary', 'date_of_joining',
-            'department__name', 'position__title'
+            'department_id', 'position_id'
         )
 
-        if search_query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) | 
-                Q(last_name__icontains=search_query) | 
-                Q(email__icontains=search_query) |
-                Q(department__name__icontains=search_query)
-            )
-        
-        if start_date and end_date:
-            queryset = queryset.filter(date_of_joining__range=[start_date, end_date])
-
-        if department_id:
-            queryset = queryset.filter(department_id=department_id)
-
-        if position_id:
-            queryset = queryset.filter(position_id=position_id)
+        queryset = filter_employees(queryset, request.query_params)
 
         return queryset.order_by('-date_of_joining')
 
     def get(self, request, format=None):
-        queryset = self.get_queryset(request)
+        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+        since = delta_since(request.query_params)
+        if since is not None:
+            until = delta_until()
+            response = self.export_response(apply_delta(self.get_queryset(request), since, until), filename)
+            return compress_response(request, count_streamed_rows(with_watermark(response, since, until)))
+
+        path = artifact_path('export_csv_v2', request.query_params)
+
+        response = artifact_response(request, path, filename)
+        if response is not None:
+            return compress_response(request, count_streamed_rows(response))
+
+        response = self.export_response(self.get_queryset(request), filename)
+        response = store_artifact(response, path)
+        return compress_response(request, count_streamed_rows(response))
+
+    def export_response(self, queryset, filename):
         column_mapping = {
             'id': 'ID',
             'first_name': 'First Name',
@@ -51,7 +53,6 @@ class EmployeeExportAPIViewV2(APIView):
             'position__title': 'Position'
         }
 
-        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
         response = StreamingHttpResponse(
             self.stream_csv(queryset, column_mapping),
             content_type="text/csv"
@@ -61,6 +62,8 @@ class EmployeeExportAPIViewV2(APIView):
 
     def stream_csv(self, queryset, column_mapping):
         yield ','.join(column_mapping.values()) + '\n'
+        department_names = departments.names()
+        position_names = positions.names()
         
         for employee in queryset.iterator():
             row = [
@@ -71,7 +74,7 @@ class EmployeeExportAPIViewV2(APIView):
                 employee.phone_number,
                 str(employee.salary),
                 employee.date_of_joining.strftime('%Y-%m-%d'),
-                employee.department.name,
-                employee.position.title
+                department_names.get(employee.department_id, ''),
+                position_names.get(employee.position_id, '')
             ]
             yield ','.join(row) + '\n'
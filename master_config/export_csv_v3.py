@@ -0,0 +1,385 @@
+import queue
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+
+from master_config.compression import compress_response
+from master_config.export_artifacts import artifact_path, artifact_response, store_artifact
+from master_config.filters import filter_employees
+from master_config.metrics import count_streamed_rows, current_metrics
+from master_config.models import Employee
+from master_config.watermarks import apply_delta, delta_since, delta_until, with_watermark
+
+
+EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('first_name', 'First Name'),
+    ('last_name', 'Last Name'),
+    ('email', 'Email'),
+    ('phone_number', 'Phone Number'),
+    ('salary', 'Salary'),
+    ('date_of_joining', 'Date of Joining'),
+    ('department__name', 'Department'),
+    ('position__title', 'Position'),
+]
+
+STREAM_BUFFER_SIZE = 256 * 1024
+
+ARCHIVE_FORMATS = ('zip',)
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+class CopyBuffer:
+    """File-like sink for ``copy_expert`` that hands data on in large blocks."""
+
+    def __init__(self, chunks, cancelled, size=STREAM_BUFFER_SIZE):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.size = size
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise CopyCancelled()
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+def stream_copy(sql, params=None, using=DEFAULT_DB_ALIAS):
+    """
+    Runs ``COPY (sql) TO STDOUT WITH CSV`` on a dedicated connection to
+    ``using`` and yields its output. The COPY runs in a producer thread because psycopg2
+    pushes COPY data into a file object rather than letting us pull it.
+    """
+    chunks = queue.Queue(maxsize=8)
+    cancelled = threading.Event()
+    done = object()
+    metrics = current_metrics.get()
+
+    def produce():
+        sink = CopyBuffer(chunks, cancelled)
+        started = time.perf_counter()
+        connection = connections[using]
+        try:
+            with connection.cursor() as cursor:
+                copy_sql = cursor.mogrify(f"COPY ({sql}) TO STDOUT WITH CSV", params).decode()
+                cursor.copy_expert(copy_sql, sink)
+            if metrics is not None:
+                metrics.db_queries += 1
+                metrics.db_time += time.perf_counter() - started
+            sink.flush()
+            sink.put(done)
+        except CopyCancelled:
+            pass
+        except Exception as e:
+            try:
+                sink.put(e)
+            except CopyCancelled:
+                pass
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=produce, name='export-copy', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+def export_copy_sql(queryset):
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    return queryset.values_list(*fields).query.sql_with_params()
+
+
+def export_header():
+    return (','.join(label for _, label in EXPORT_COLUMNS) + '\n').encode('utf-8')
+
+
+def stream_export(queryset):
+    sql, params = export_copy_sql(queryset)
+    yield export_header()
+    yield from stream_copy(sql, params, using=queryset.db)
+
+
+def shard_count(query_params, default=1):
+    value = query_params.get('shards')
+    if not value:
+        return default
+    try:
+        shards = int(value)
+    except ValueError:
+        shards = 0
+    if not 1 <= shards <= settings.EXPORT_MAX_SHARDS:
+        raise ValidationError({'shards': f'Expected a number from 1 to {settings.EXPORT_MAX_SHARDS}.'})
+    return shards
+
+
+def archive_format(query_params):
+    archive = query_params.get('archive')
+    if archive and archive not in ARCHIVE_FORMATS:
+        raise ValidationError({
+            'archive': f'Unsupported archive: {archive}. Expected one of: {", ".join(ARCHIVE_FORMATS)}'
+        })
+    return archive
+
+
+def shard_ranges(queryset, shards):
+    """
+    Splits ``queryset`` into up to ``shards`` ranges of ``(date_of_joining,
+    id)`` holding about as many rows each, latest first, so shards taken in
+    order keep the export's ``-date_of_joining`` order. Returns ``(start,
+    end, first, last)`` per shard: rows from ``start`` up to but excluding
+    ``end`` (both keys, with None leaving that side open), joining from
+    ``first`` to ``last``.
+
+    The bounds are ``ntile`` quantiles rather than equal stretches of the
+    calendar, so outlying dates don't leave one shard with nearly every row.
+    """
+    sql, params = queryset.order_by().values('date_of_joining', 'id').query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT DISTINCT ON (shard) date_of_joining, id, '
+            'min(date_of_joining) OVER (PARTITION BY shard), max(date_of_joining) OVER (PARTITION BY shard) '
+            f'FROM (SELECT *, ntile(%s) OVER (ORDER BY date_of_joining, id) AS shard FROM ({sql}) AS rows) AS shards '
+            'ORDER BY shard, date_of_joining, id',
+            [shards, *params]
+        )
+        quantiles = cursor.fetchall()
+    starts = [None] + [(first, id) for first, id, _, _ in quantiles[1:]]
+    ends = starts[1:] + [None]
+    return [
+        (start, end, first, last)
+        for start, end, (_, _, first, last) in reversed(list(zip(starts, ends, quantiles)))
+    ]
+
+
+def in_shard(queryset, start, end):
+    """``queryset`` narrowed to the ``[start, end)`` range of ``(date_of_joining, id)`` keys."""
+    if start is not None:
+        queryset = queryset.filter(
+            Q(date_of_joining__gt=start[0]) | Q(date_of_joining=start[0], id__gte=start[1])
+        )
+    if end is not None:
+        queryset = queryset.filter(
+            Q(date_of_joining__lt=end[0]) | Q(date_of_joining=end[0], id__lt=end[1])
+        )
+    return queryset
+
+
+class ShardFile:
+    """Temporary file a shard's COPY writes to; stops the COPY once cancelled."""
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+        self.file = tempfile.TemporaryFile()
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise CopyCancelled()
+        self.file.write(data)
+
+    def blocks(self):
+        self.file.seek(0)
+        while True:
+            block = self.file.read(STREAM_BUFFER_SIZE)
+            if not block:
+                break
+            yield block
+
+    def close(self):
+        self.file.close()
+
+
+def copy_shard(alias, snapshot, sql, params, sink):
+    """COPYs one shard into ``sink`` on this thread's own connection, as of ``snapshot``."""
+    started = time.perf_counter()
+    connection = connections[alias]
+    try:
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+            copy_sql = cursor.mogrify(f"COPY ({sql}) TO STDOUT WITH CSV", params).decode()
+            cursor.copy_expert(copy_sql, sink)
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+
+def copy_shards(queryset, shards):
+    """
+    Yields ``(first, last, file)`` for each shard of ``queryset``, in export
+    order, as soon as it and every shard before it have been written;
+    ``first`` and ``last`` are the joining dates the shard covers.
+
+    Shards are COPYed concurrently by ``EXPORT_SHARD_WORKERS`` threads, each
+    on its own connection; psycopg2 lets go of the GIL while Postgres does
+    the work. They all read the snapshot exported by this thread's
+    connection, so together they are one consistent export, as with
+    ``pg_dump --jobs``.
+    """
+    alias = queryset.db
+    metrics = current_metrics.get()
+    cancelled = threading.Event()
+    executor = None
+    pending = []
+    try:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute('SELECT pg_export_snapshot()')
+            snapshot = cursor.fetchone()[0]
+
+            # Read as of the snapshot, so the bounds match what the shards see.
+            ranges = shard_ranges(queryset, shards)
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, min(len(ranges), settings.EXPORT_SHARD_WORKERS)),
+                thread_name_prefix='export-shard'
+            )
+            for start, end, first, last in ranges:
+                sql, params = export_copy_sql(in_shard(queryset, start, end))
+                sink = ShardFile(cancelled)
+                future = executor.submit(copy_shard, alias, snapshot, sql, params, sink)
+                pending.append((first, last, sink, future))
+
+            # The snapshot can only be imported while this transaction is
+            # open, so it stays open until the last shard is written.
+            while pending:
+                first, last, sink, future = pending[0]
+                elapsed = future.result()
+                if metrics is not None:
+                    metrics.db_queries += 1
+                    metrics.db_time += elapsed
+                pending.pop(0)
+                try:
+                    yield first, last, sink
+                finally:
+                    sink.close()
+    finally:
+        cancelled.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for _, _, sink, _ in pending:
+            sink.close()
+
+
+def stream_sharded_export(queryset, shards):
+    """The same body as ``stream_export``, built from shards written in parallel."""
+    yield export_header()
+    for _, _, sink in copy_shards(queryset, shards):
+        yield from sink.blocks()
+
+
+class ZipSink:
+    """Write-only target for ``ZipFile`` whose output is taken as it is produced."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+        return data
+
+
+def shard_name(index, first, last):
+    return f'employees_{index + 1:03d}_{first.isoformat()}_{last.isoformat()}.csv'
+
+
+def stream_zip_export(queryset, shards):
+    """ZIP archive with one CSV, header included, per shard."""
+    sink = ZipSink()
+    # ZipFile streams to an unseekable target by writing each entry's sizes
+    # after its data.
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for index, (first, last, shard) in enumerate(copy_shards(queryset, shards)):
+            with archive.open(shard_name(index, first, last), 'w', force_zip64=True) as entry:
+                entry.write(export_header())
+                for block in shard.blocks():
+                    entry.write(block)
+                    if len(sink.buffer) >= STREAM_BUFFER_SIZE:
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+class EmployeeExportAPIViewV3(APIView):
+    def get_queryset(self, request):
+        queryset = Employee.objects.all()
+
+        queryset = filter_employees(queryset, request.query_params)
+
+        return queryset.order_by('-date_of_joining')
+
+    def export_response(self, queryset, filename, shards=1):
+        body = stream_sharded_export(queryset, shards) if shards > 1 else stream_export(queryset)
+        response = StreamingHttpResponse(body, content_type="text/csv")
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def zip_response(self, queryset, filename, shards):
+        response = StreamingHttpResponse(stream_zip_export(queryset, shards), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def get(self, request, format=None):
+        filename = f"employees_export_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+        since = delta_since(request.query_params)
+        if since is not None:
+            until = delta_until()
+            response = self.export_response(apply_delta(self.get_queryset(request), since, until), filename)
+            return compress_response(request, count_streamed_rows(with_watermark(response, since, until)))
+
+        if archive_format(request.query_params) == 'zip':
+            # Already compressed, and not one CSV to count rows in.
+            shards = shard_count(request.query_params, default=settings.EXPORT_SHARD_WORKERS)
+            return self.zip_response(self.get_queryset(request), filename[:-len('.csv')] + '.zip', shards)
+
+        shards = shard_count(request.query_params)
+        path = artifact_path('export_csv_v3', request.query_params)
+        response = artifact_response(request, path, filename)
+        if response is None:
+            response = store_artifact(self.export_response(self.get_queryset(request), filename, shards), path)
+
+        return compress_response(request, count_streamed_rows(response))
@@ -0,0 +1,63 @@
+from django.db.models import Q
+
+from master_config.models import Department
+
+
+def matching_departments(search_query):
+    return Department.objects.filter(name__icontains=search_query).values_list('id', flat=True)
+
+
+def search_condition(search_query, department_ids):
+    # Each branch has to stay on the employees table so Postgres can combine
+    # the trigram indexes with a BitmapOr; department names are resolved to
+    # ids up front instead of being matched through a join.
+    condition = (
+        Q(first_name__icontains=search_query) |
+        Q(last_name__icontains=search_query) |
+        Q(email__icontains=search_query)
+    )
+    if department_ids:
+        condition |= Q(department_id__in=department_ids)
+    return condition
+
+
+def apply_search(queryset, search_query):
+    if not search_query:
+        return queryset
+    department_ids = list(matching_departments(search_query))
+    return queryset.filter(search_condition(search_query, department_ids))
+
+
+async def aapply_search(queryset, search_query):
+    if not search_query:
+        return queryset
+    department_ids = [pk async for pk in matching_departments(search_query)]
+    return queryset.filter(search_condition(search_query, department_ids))
+
+
+def filter_employees(queryset, query_params):
+    queryset = apply_search(queryset, query_params.get('search', ''))
+    return apply_filters(queryset, query_params)
+
+
+async def afilter_employees(queryset, query_params):
+    queryset = await aapply_search(queryset, query_params.get('search', ''))
+    return apply_filters(queryset, query_params)
+
+
+def apply_filters(queryset, query_params):
+    start_date = query_params.get('start_date', None)
+    end_date = query_params.get('end_date', None)
+    department_id = query_params.get('department', None)
+    position_id = query_params.get('position', None)
+
+    if start_date and end_date:
+        queryset = queryset.filter(date_of_joining__range=[start_date, end_date])
+
+    if department_id:
+        queryset = queryset.filter(department_id=department_id)
+
+    if position_id:
+        queryset = queryset.filter(position_id=position_id)
+
+    return queryset
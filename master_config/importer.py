@@ -0,0 +1,633 @@
+import csv
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+
+from .caching import bump_data_version
+from .dimensions import bump_dimension_version, departments, positions
+from .stats import refresh_employee_stats
+from .models import Department, Employee, ImportJob, Position
+from .partitioning import EMAIL_LOCK_KEY, is_partitioned
+from .routers import extend_pin
+from .validation import chunk_rejects_path, parse_chunk, rejects_path, row_errors, write_rejects
+
+
+logger = logging.getLogger(__name__)
+
+EXPECTED_HEADERS = [
+    'date_of_birth', 'department', 'position', 'salary',
+    'date_of_joining', 'first_name', 'last_name', 'email', 'phone_number'
+]
+
+MAX_HEADER_SIZE = 64 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix='import-job')
+
+
+class ImportValidationError(Exception):
+    pass
+
+
+def staging_table_name(job_id, chunk_index):
+    return f"staging_{job_id.hex}_{chunk_index}"
+
+
+def drop_staging_tables(job_id, chunks):
+    if not chunks:
+        return
+    tables = ', '.join(staging_table_name(job_id, chunk['index']) for chunk in chunks)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {tables}")
+
+
+def discard_rejects(job_id, chunks):
+    paths = [chunk_rejects_path(job_id, chunk['index']) for chunk in chunks]
+    for path in paths + [rejects_path(job_id)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def validate_headers(headers):
+    missing_headers = [h for h in EXPECTED_HEADERS if h not in headers]
+    if missing_headers:
+        raise ImportValidationError(f'Missing required columns: {", ".join(missing_headers)}')
+
+    unexpected_headers = [h for h in headers if h not in EXPECTED_HEADERS]
+    if unexpected_headers:
+        raise ImportValidationError(f'Unexpected columns: {", ".join(unexpected_headers)}')
+
+
+def resolve_names(frame, chunk):
+    """
+    Adds department and position ids looked up by name in the process's
+    dimension cache. Names it doesn't know are left without an id and
+    listed on the chunk, to be created when the chunk is merged.
+    """
+    frame = frame.assign(
+        department_id=frame['department'].map(departments.ids()).astype('Int64'),
+        position_id=frame['position'].map(positions.ids()).astype('Int64'),
+    )
+    chunk['new_departments'] = sorted(set(frame.loc[frame['department_id'].isna(), 'department']))
+    chunk['new_positions'] = sorted(set(frame.loc[frame['position_id'].isna(), 'position']))
+    return frame
+
+
+def create_new_names(cursor, chunk, staging_table, now):
+    """Creates the departments and positions a chunk introduced and fills in their ids."""
+    created = 0
+    if chunk['new_departments']:
+        cursor.execute(f"""
+        INSERT INTO {Department._meta.db_table} (name, location, created_at)
+        SELECT name, 'Unknown', %s FROM unnest(%s::text[]) AS name
+        ON CONFLICT (name) DO NOTHING
+        """, [now, chunk['new_departments']])
+        created += cursor.rowcount
+        cursor.execute(f"""
+        UPDATE {staging_table} s SET department_id = d.id
+        FROM {Department._meta.db_table} d
+        WHERE s.department_id IS NULL AND d.name = s.department
+        """)
+    if chunk['new_positions']:
+        cursor.execute(f"""
+        INSERT INTO {Position._meta.db_table} (title, created_at)
+        SELECT title, %s FROM unnest(%s::text[]) AS title
+        ON CONFLICT (title) DO NOTHING
+        """, [now, chunk['new_positions']])
+        created += cursor.rowcount
+        cursor.execute(f"""
+        UPDATE {staging_table} s SET position_id = p.id
+        FROM {Position._meta.db_table} p
+        WHERE s.position_id IS NULL AND p.title = s.position
+        """)
+    if created:
+        bump_dimension_version()
+
+
+class StagingLoader:
+    """
+    Streams an uploaded CSV into unlogged staging tables in a single pass.
+
+    The header is validated from the first bytes received. The rest of the
+    stream is cut into chunks of about ``IMPORT_CHUNK_SIZE`` bytes on record
+    boundaries, and each chunk is loaded with ``COPY ... FROM STDIN`` into its
+    own staging table by a pool of ``IMPORT_PARALLELISM`` workers, each on its
+    own connection. A failing chunk is recorded without affecting the others.
+
+    Before its COPY, each chunk is validated with pandas. Rows that would
+    fail the COPY or the merge are left out and written, with their line
+    numbers and the reasons, to a rejects CSV for the job. Department and
+    position names are resolved to ids at the same time, so merges need
+    no joins.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.buffer = bytearray()
+        self.headers = None
+        self.chunks = []
+        self.futures = []
+        self.executor = None
+        self.slots = None
+        self.next_line = 2
+        self.rows = 0
+        self.rows_rejected = 0
+        self.rejects = None
+        self.error = None
+
+    def feed(self, data):
+        if self.error:
+            return
+
+        self.buffer += data
+
+        if self.headers is None:
+            line_end = self.buffer.find(b'\n')
+            if line_end == -1:
+                if len(self.buffer) > MAX_HEADER_SIZE:
+                    self.error = 'CSV header row is too long'
+                return
+
+            try:
+                self.start(bytes(self.buffer[:line_end]))
+            except ImportValidationError as e:
+                self.error = str(e)
+                return
+            except Exception as e:
+                self.error = f'Error validating CSV: {str(e)}'
+                return
+            del self.buffer[:line_end + 1]
+
+        while len(self.buffer) >= settings.IMPORT_CHUNK_SIZE:
+            end = self.record_boundary()
+            if not end:
+                break
+            self.submit(bytes(self.buffer[:end]))
+            del self.buffer[:end]
+
+    def record_boundary(self):
+        # The first newline past the chunk size ends a record when the quotes
+        # before it are balanced; escaped quotes are doubled so they never
+        # change the parity. A stray quote would leave them unbalanced for
+        # the rest of the upload, so past twice the chunk size the chunk is
+        # cut at the last newline anyway and its malformed record rejected.
+        end = self.buffer.find(b'\n', settings.IMPORT_CHUNK_SIZE - 1) + 1
+        quotes = self.buffer.count(b'"', 0, end) if end else 0
+        while end and quotes % 2:
+            next_end = self.buffer.find(b'\n', end) + 1
+            if not next_end:
+                if len(self.buffer) >= 2 * settings.IMPORT_CHUNK_SIZE:
+                    return self.buffer.rfind(b'\n') + 1
+                return 0
+            quotes += self.buffer.count(b'"', end, next_end)
+            end = next_end
+        return end
+
+    def start(self, header_line):
+        header_line = header_line.decode('utf-8-sig').rstrip('\r')
+        self.headers = [h.strip() for h in next(csv.reader([header_line]), [])]
+        validate_headers(self.headers)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.IMPORT_PARALLELISM, thread_name_prefix=f'staging-copy-{self.job_id}'
+        )
+        self.slots = threading.BoundedSemaphore(settings.IMPORT_PARALLELISM)
+
+    def submit(self, data):
+        chunk = {
+            'index': len(self.chunks),
+            'first_line': self.next_line,
+            'last_line': self.next_line + data.count(b'\n', 0, len(data) - 1),
+            'rows': 0,
+            'rejected': 0,
+            'new_departments': [],
+            'new_positions': [],
+            'error': None,
+        }
+        self.next_line = chunk['last_line'] + 1
+        self.chunks.append(chunk)
+
+        # Bound the number of chunks held in memory while the upload keeps
+        # streaming in.
+        self.slots.acquire()
+        future = self.executor.submit(self.copy_chunk, chunk, data)
+        future.add_done_callback(lambda f: self.slots.release())
+        self.futures.append(future)
+
+    def copy_chunk(self, chunk, data):
+        staging_table = staging_table_name(self.job_id, chunk['index'])
+        try:
+            frame, malformed = parse_chunk(data, chunk['first_line'], self.headers)
+            errors = row_errors(frame)
+            valid = errors == ''
+
+            rejected = malformed + [
+                (line, error, list(fields))
+                for line, error, fields in zip(
+                    frame.index[~valid], errors[~valid], frame[~valid].itertuples(index=False)
+                )
+            ]
+            if rejected:
+                rejected.sort(key=lambda row: row[0])
+                write_rejects(chunk_rejects_path(self.job_id, chunk['index']), rejected)
+            chunk['rejected'] = len(rejected)
+
+            rows = io.StringIO()
+            resolve_names(frame[valid], chunk).to_csv(rows, header=False)
+            rows.seek(0)
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                CREATE UNLOGGED TABLE {staging_table} (
+                    line_no BIGINT,
+                    date_of_birth DATE,
+                    department VARCHAR(100),
+                    position VARCHAR(100),
+                    salary NUMERIC(10,2),
+                    date_of_joining DATE,
+                    first_name VARCHAR(100),
+                    last_name VARCHAR(100),
+                    email VARCHAR(254),
+                    phone_number VARCHAR(15),
+                    department_id BIGINT,
+                    position_id BIGINT
+                )
+                """)
+                cursor.copy_expert(
+                    f"COPY {staging_table} (line_no, {', '.join(self.headers)}, department_id, position_id) "
+                    f"FROM STDIN WITH CSV",
+                    rows
+                )
+                chunk['rows'] = cursor.rowcount
+        except Exception as e:
+            chunk['error'] = str(e)
+        finally:
+            connection.close()
+
+    def collect_rejects(self):
+        """Joins the chunks' rejects, in line order, into the job's rejects CSV."""
+        parts = [
+            chunk_rejects_path(self.job_id, chunk['index'])
+            for chunk in self.chunks if chunk['rejected']
+        ]
+        if not parts:
+            return
+        self.rejects = rejects_path(self.job_id)
+        with open(self.rejects, 'w', newline='', encoding='utf-8') as rejects:
+            csv.writer(rejects).writerow(['line', 'errors', *self.headers])
+            for part in parts:
+                with open(part, encoding='utf-8', newline='') as f:
+                    rejects.write(f.read())
+                os.remove(part)
+
+    def finish(self):
+        if self.executor is None:
+            if not self.error:
+                self.error = 'CSV file has no data rows'
+            return
+
+        if self.buffer.strip():
+            self.submit(bytes(self.buffer))
+        self.buffer = bytearray()
+
+        wait(self.futures)
+        self.executor.shutdown()
+
+        self.rows = sum(chunk['rows'] for chunk in self.chunks)
+        self.rows_rejected = sum(chunk['rejected'] for chunk in self.chunks)
+        self.collect_rejects()
+        failed = [chunk for chunk in self.chunks if chunk['error']]
+
+        if self.chunks and len(failed) == len(self.chunks):
+            self.error = f'Error during import: {failed[0]["error"]}'
+        elif not self.rows and not self.rows_rejected:
+            self.error = 'CSV file has no data rows'
+
+        if self.error:
+            drop_staging_tables(self.job_id, self.chunks)
+            self.discard_rejects()
+
+    def discard_rejects(self):
+        discard_rejects(self.job_id, self.chunks)
+        self.rejects = None
+
+    def abort(self):
+        self.error = self.error or 'Upload interrupted'
+        if self.executor is not None:
+            self.executor.shutdown()
+            drop_staging_tables(self.job_id, self.chunks)
+            self.discard_rejects()
+
+
+def merge_chunk(job, chunk):
+    staging_table = staging_table_name(job.pk, chunk['index'])
+    now = timezone.now()
+
+    try:
+        with connection.cursor() as cursor:
+            create_new_names(cursor, chunk, staging_table, now)
+
+            # Chunks are merged concurrently; feeding rows in email order makes
+            # every worker take row locks in the same order, so overlapping
+            # chunks wait on each other instead of deadlocking.
+            if is_partitioned(cursor):
+                created, updated = merge_into_partitions(cursor, job, staging_table, now)
+            elif job.mode == ImportJob.MODE_UPSERT:
+                cursor.execute(f"""
+                WITH merged AS (
+                    INSERT INTO {Employee._meta.db_table} AS e (
+                        first_name, last_name, email, phone_number,
+                        date_of_birth, date_of_joining, salary,
+                        department_id, position_id, created_at, updated_at
+                    )
+                    SELECT DISTINCT ON (s.email)
+                        s.first_name,
+                        s.last_name,
+                        s.email,
+                        s.phone_number,
+                        s.date_of_birth,
+                        s.date_of_joining,
+                        s.salary,
+                        s.department_id,
+                        s.position_id,
+                        %s,
+                        %s
+                    FROM {staging_table} s
+                    ORDER BY s.email, s.line_no DESC
+                    ON CONFLICT (email) DO UPDATE SET
+                        first_name = EXCLUDED.first_name,
+                        last_name = EXCLUDED.last_name,
+                        phone_number = EXCLUDED.phone_number,
+                        date_of_birth = EXCLUDED.date_of_birth,
+                        date_of_joining = EXCLUDED.date_of_joining,
+                        salary = EXCLUDED.salary,
+                        department_id = EXCLUDED.department_id,
+                        position_id = EXCLUDED.position_id,
+                        updated_at = EXCLUDED.updated_at
+                    WHERE (
+                        e.first_name, e.last_name, e.phone_number, e.date_of_birth,
+                        e.date_of_joining, e.salary, e.department_id, e.position_id
+                    ) IS DISTINCT FROM (
+                        EXCLUDED.first_name, EXCLUDED.last_name, EXCLUDED.phone_number, EXCLUDED.date_of_birth,
+                        EXCLUDED.date_of_joining, EXCLUDED.salary, EXCLUDED.department_id, EXCLUDED.position_id
+                    )
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+                FROM merged
+                """, [now, now])
+                created, updated = cursor.fetchone()
+            else:
+                cursor.execute(f"""
+                INSERT INTO {Employee._meta.db_table} (
+                    first_name, last_name, email, phone_number,
+                    date_of_birth, date_of_joining, salary,
+                    department_id, position_id, created_at, updated_at
+                )
+                SELECT
+                    s.first_name,
+                    s.last_name,
+                    s.email,
+                    s.phone_number,
+                    s.date_of_birth,
+                    s.date_of_joining,
+                    s.salary,
+                    s.department_id,
+                    s.position_id,
+                    %s,
+                    %s
+                FROM {staging_table} s
+                ORDER BY s.email, s.line_no
+                ON CONFLICT (email) DO NOTHING
+                """, [now, now])
+                created, updated = cursor.rowcount, 0
+
+            cursor.execute(f"DROP TABLE {staging_table}")
+    finally:
+        connection.close()
+
+    return created, updated
+
+
+def merge_into_partitions(cursor, job, staging_table, now):
+    """
+    Merge for a partitioned ``employees``. Its unique index on email also
+    covers the partition key, so there is no ON CONFLICT target: existing
+    rows are matched by email and updated, then the rest inserted. The
+    advisory lock makes merges take turns so two chunks can't both insert
+    the same new email.
+    """
+    upsert = job.mode == ImportJob.MODE_UPSERT
+    update = f"""
+    updated AS (
+        UPDATE {Employee._meta.db_table} e SET
+            first_name = s.first_name,
+            last_name = s.last_name,
+            phone_number = s.phone_number,
+            date_of_birth = s.date_of_birth,
+            date_of_joining = s.date_of_joining,
+            salary = s.salary,
+            department_id = s.department_id,
+            position_id = s.position_id,
+            updated_at = %(now)s
+        FROM source s
+        WHERE e.email = s.email AND (
+            e.first_name, e.last_name, e.phone_number, e.date_of_birth,
+            e.date_of_joining, e.salary, e.department_id, e.position_id
+        ) IS DISTINCT FROM (
+            s.first_name, s.last_name, s.phone_number, s.date_of_birth,
+            s.date_of_joining, s.salary, s.department_id, s.position_id
+        )
+        RETURNING 1
+    ),""" if upsert else ''
+
+    with transaction.atomic():
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [EMAIL_LOCK_KEY])
+        cursor.execute(f"""
+        WITH source AS (
+            SELECT DISTINCT ON (s.email)
+                s.first_name,
+                s.last_name,
+                s.email,
+                s.phone_number,
+                s.date_of_birth,
+                s.date_of_joining,
+                s.salary,
+                s.department_id,
+                s.position_id
+            FROM {staging_table} s
+            ORDER BY s.email, s.line_no {'DESC' if upsert else 'ASC'}
+        ),{update}
+        inserted AS (
+            INSERT INTO {Employee._meta.db_table} (
+                first_name, last_name, email, phone_number,
+                date_of_birth, date_of_joining, salary,
+                department_id, position_id, created_at, updated_at
+            )
+            SELECT
+                s.first_name, s.last_name, s.email, s.phone_number,
+                s.date_of_birth, s.date_of_joining, s.salary,
+                s.department_id, s.position_id, %(now)s, %(now)s
+            FROM source s
+            WHERE NOT EXISTS (SELECT 1 FROM {Employee._meta.db_table} e WHERE e.email = s.email)
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM inserted),
+            {'(SELECT COUNT(*) FROM updated)' if upsert else '0'}
+        """, {'now': now})
+        return cursor.fetchone()
+
+
+def drop_superseded_rows(job, chunks):
+    """
+    Keeps one row per email across all chunks: the last one in the file for
+    an upsert, the first for an insert. Chunks are merged concurrently, so
+    an email in two chunks would otherwise go to whichever merge ran last
+    (upsert) or committed first (insert). Duplicates within a chunk are
+    left to the merge itself.
+    """
+    if len(chunks) < 2:
+        return
+    winners = f"staging_{job.pk.hex}_winners"
+    tables = [staging_table_name(job.pk, chunk['index']) for chunk in chunks]
+    pick = 'max' if job.mode == ImportJob.MODE_UPSERT else 'min'
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+            CREATE UNLOGGED TABLE {winners} AS
+            SELECT email, {pick}(line_no) AS line_no
+            FROM ({' UNION ALL '.join(f'SELECT email, line_no FROM {table}' for table in tables)}) s
+            GROUP BY email
+            HAVING COUNT(*) > 1
+            """)
+            if not cursor.rowcount:
+                return
+            cursor.execute(f"ANALYZE {winners}")
+            for table in tables:
+                cursor.execute(f"""
+                DELETE FROM {table} s USING {winners} w
+                WHERE w.email = s.email AND s.line_no <> w.line_no
+                """)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {winners}")
+
+
+def import_employees(job):
+    chunks = [chunk for chunk in job.chunks if not chunk['error']]
+    drop_superseded_rows(job, chunks)
+
+    with ThreadPoolExecutor(max_workers=settings.IMPORT_PARALLELISM, thread_name_prefix=f'merge-{job.pk}') as executor:
+        futures = {executor.submit(merge_chunk, job, chunk): chunk for chunk in chunks}
+
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                created, updated = future.result()
+            except Exception as e:
+                logger.exception('Import job %s failed to merge chunk %s', job.pk, chunk['index'])
+                chunk['error'] = f'Error during import: {str(e)}'
+                continue
+
+            job.rows_processed += chunk['rows']
+            job.employees_created += created
+            job.employees_updated += updated
+            job.employees_unchanged += chunk['rows'] - created - updated
+            ImportJob.objects.filter(pk=job.pk).update(
+                rows_processed=job.rows_processed,
+                employees_created=job.employees_created,
+                employees_updated=job.employees_updated,
+                employees_unchanged=job.employees_unchanged,
+                updated_at=timezone.now(),
+            )
+
+
+def chunk_errors(chunks):
+    return [
+        {
+            'chunk': chunk['index'],
+            'first_line': chunk['first_line'],
+            'last_line': chunk['last_line'],
+            'error': chunk['error'],
+        }
+        for chunk in chunks if chunk['error']
+    ]
+
+
+class Heartbeat:
+    """
+    Touches a running job's ``updated_at`` every ``IMPORT_HEARTBEAT_INTERVAL``
+    seconds, however long a single merge takes. A running job whose
+    heartbeat has stopped was orphaned by a worker restart.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'import-heartbeat-{job_id}', daemon=True)
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.IMPORT_HEARTBEAT_INTERVAL):
+                ImportJob.objects.filter(pk=self.job_id, status=ImportJob.STATUS_RUNNING).update(
+                    updated_at=timezone.now()
+                )
+        except Exception:
+            logger.exception('Heartbeat for import job %s stopped', self.job_id)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_import_job(job_id):
+    close_old_connections()
+    job = ImportJob.objects.get(pk=job_id)
+    job.status = ImportJob.STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'updated_at'])
+
+    try:
+        with Heartbeat(job.pk):
+            import_employees(job)
+        failed = [chunk for chunk in job.chunks if chunk['error']]
+        if len(failed) == len(job.chunks) or not job.rows_processed:
+            job.status = ImportJob.STATUS_FAILED
+        elif failed or job.rows_rejected:
+            job.status = ImportJob.STATUS_PARTIAL
+        else:
+            job.status = ImportJob.STATUS_COMPLETED
+    except Exception as e:
+        logger.exception('Import job %s failed', job.pk)
+        job.status = ImportJob.STATUS_FAILED
+        job.errors = job.errors + [{'error': f'Error during import: {str(e)}'}]
+    finally:
+        job.errors = chunk_errors(job.chunks) + [error for error in job.errors if 'chunk' not in error]
+        job.finished_at = timezone.now()
+        job.save()
+        drop_staging_tables(job.pk, job.chunks)
+        if job.employees_created or job.employees_updated:
+            try:
+                refresh_employee_stats()
+            except Exception:
+                logger.exception('Refreshing employee stats after import job %s failed', job.pk)
+        bump_data_version()
+        extend_pin(job.pk)
+        connections.close_all()
+
+
+def enqueue_import_job(job):
+    transaction.on_commit(lambda: _executor.submit(run_import_job, job.pk))
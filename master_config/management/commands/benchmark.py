@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from master_config.caching import bump_data_version
+from master_config.dimensions import bump_dimension_version
+from master_config.models import Department, Employee, ImportJob, Position
+from master_config.stats import refresh_employee_stats
+
+
+SERVER_TIMING_DB_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+UPLOAD_DOMAIN = 'bench-upload.example.com'
+UPLOAD_DEPARTMENT = 'Benchmark Department'
+UPLOAD_POSITION = 'Benchmark Position'
+
+
+def csv_field(value):
+    return '"%s"' % value.replace('"', '""')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark employee-list/, the CSV exports and upload-csv/ against the configured '
+        'database and write the results as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Keep caches between iterations. By default every iteration runs uncached.'
+        )
+        parser.add_argument('--upload-rows', type=int, default=10_000)
+        parser.add_argument(
+            '--upload-timeout', type=int, default=600,
+            help='Stop waiting for an upload job after this many seconds.'
+        )
+        parser.add_argument('--skip-exports', action='store_true')
+        parser.add_argument('--skip-upload', action='store_true')
+        parser.add_argument(
+            '--output', default=None,
+            help='Where to write the JSON report. Defaults to benchmark_results/<commit>-<timestamp>.json.'
+        )
+
+    def handle(self, *args, **options):
+        self.client = Client()
+        self.iterations = options['iterations']
+        self.warm = options['warm']
+
+        department_id = Department.objects.order_by('id').values_list('id', flat=True).first()
+        position_id = Position.objects.order_by('id').values_list('id', flat=True).first()
+        search_term = Employee.objects.order_by('id').values_list('last_name', flat=True).first() or 'a'
+        deep_page = max(Employee.objects.count() // 20 // 2, 1)
+
+        scenarios = [
+            ('list_first_page', '/apiV1/employee-list/', {}),
+            ('list_deep_page', '/apiV1/employee-list/', {'page': deep_page}),
+            ('list_exact_count', '/apiV1/employee-list/', {'exact_count': 'true'}),
+            ('list_search', '/apiV1/employee-list/', {'search': search_term}),
+            ('list_search_estimated_count', '/apiV1/employee-list/', {'search': search_term, 'exact_count': 'false'}),
+            ('list_filters', '/apiV1/employee-list/', {
+                'department': department_id, 'position': position_id,
+                'start_date': '2015-01-01', 'end_date': '2020-12-31',
+            }),
+            ('list_cursor_first_page', '/apiV1/employee-list/', {'pagination': 'cursor'}),
+            ('employee_stats', '/apiV1/employee-stats/', {}),
+        ]
+        if not options['skip_exports']:
+            for name, url in [
+                ('export_v1', '/apiV1/export-csv/'),
+                ('export_v2', '/apiV1/export-csv-v2/'),
+                ('export_v3', '/apiV1/export-csv-v3/'),
+            ]:
+                scenarios.append((f'{name}_department', url, {'department': department_id}))
+                scenarios.append((f'{name}_full', url, {}))
+                scenarios.append((f'{name}_full_gzip', url, {'compression': 'gzip'}))
+
+        results = []
+        with tempfile.TemporaryDirectory() as artifact_root, override_settings(EXPORT_ARTIFACT_ROOT=artifact_root):
+            for name, url, params in scenarios:
+                results.append(self.run_scenario(name, url, params))
+            results.append(self.run_cursor_walk(pages=50))
+
+        if not options['skip_upload']:
+            results.append(self.run_upload(options['upload_rows'], options['upload_timeout']))
+
+        report = {
+            'commit': self.git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.settings_dict['NAME'],
+            'vendor_version': self.server_version(),
+            'dataset': {
+                'employees': Employee.objects.count(),
+                'departments': Department.objects.count(),
+                'positions': Position.objects.count(),
+            },
+            'iterations': self.iterations,
+            'warm': self.warm,
+            'scenarios': results,
+        }
+
+        path = options['output'] or os.path.join(
+            'benchmark_results', f"{report['commit'][:12]}-{timezone.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<32} p50 {result['latency_ms']['p50']:>9.1f} ms"
+                f"  p95 {result['latency_ms']['p95']:>9.1f} ms"
+                + (f"  {result['rows_per_second']:>12,.0f} rows/s" if result.get('rows_per_second') else '')
+            )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
+
+    def request(self, url, params):
+        if not self.warm:
+            bump_data_version()
+        started = time.perf_counter()
+        response = self.client.get(url, params)
+        if response.streaming:
+            body_size = 0
+            rows = 0
+            for chunk in response.streaming_content:
+                body_size += len(chunk)
+                rows += chunk.count(b'\n')
+        else:
+            body_size = len(response.content)
+            rows = None
+        elapsed = time.perf_counter() - started
+
+        # Server-Timing on a streamed response predates the body, so it
+        # leaves out the queries that produce it.
+        match = None if response.streaming else SERVER_TIMING_DB_RE.search(response.get('Server-Timing', ''))
+        return {
+            'status': response.status_code,
+            'seconds': elapsed,
+            'bytes': body_size,
+            'rows': rows,
+            'db_ms': float(match.group(1)) if match else None,
+            'queries': int(match.group(2)) if match else None,
+            'response': response,
+        }
+
+    def run_scenario(self, name, url, params):
+        samples = [self.request(url, params) for _ in range(self.iterations)]
+        result = self.summarize(name, samples)
+        result.update({'url': url, 'params': params})
+        rows = samples[-1]['rows']
+        if rows:
+            # Streamed exports carry a header line; compressed ones can't be counted.
+            if params.get('compression'):
+                result['rows_per_second'] = None
+            else:
+                result['rows'] = rows - 1
+                result['rows_per_second'] = (rows - 1) / statistics.median(s['seconds'] for s in samples)
+        return result
+
+    def run_cursor_walk(self, pages):
+        """Follows ``pages`` cursor links to measure deep keyset pagination."""
+        samples = []
+        url, params = '/apiV1/employee-list/', {'pagination': 'cursor'}
+        for _ in range(pages):
+            sample = self.request(url, params)
+            samples.append(sample)
+            cursor = sample['response'].json().get('cursors', {}).get('next')
+            if not cursor:
+                break
+            params = {'pagination': 'cursor', 'cursor': cursor}
+        result = self.summarize('list_cursor_walk', samples)
+        result['pages'] = len(samples)
+        return result
+
+    def run_upload(self, rows, timeout):
+        # Existing names keep the upload from adding rows to the dimension
+        # tables; on an empty database the ones it creates are removed after.
+        department = Department.objects.order_by('id').values_list('name', flat=True).first()
+        position = Position.objects.order_by('id').values_list('title', flat=True).first()
+        created_department = department is None
+        created_position = position is None
+        department = department or UPLOAD_DEPARTMENT
+        position = position or UPLOAD_POSITION
+
+        samples = []
+        for _ in range(self.iterations):
+            token = uuid.uuid4().hex[:8]
+            lines = ['first_name,last_name,email,phone_number,date_of_birth,date_of_joining,salary,department,position']
+            lines.extend(
+                f'Bench,Upload{i},bench{i}.{token}@{UPLOAD_DOMAIN},9000000000,1990-01-01,2024-01-01,50000.00,'
+                f'{csv_field(department)},{csv_field(position)}'
+                for i in range(rows)
+            )
+            upload = SimpleUploadedFile('benchmark.csv', ('\n'.join(lines) + '\n').encode('utf-8'), 'text/csv')
+
+            started = time.perf_counter()
+            response = self.client.post('/apiV1/upload-csv/', {'file': upload})
+            accepted = time.perf_counter() - started
+            job_status = None
+            if response.status_code == 202:
+                job_id = response.json()['job_id']
+                deadline = started + timeout
+                while True:
+                    job_status = ImportJob.objects.filter(pk=job_id).values_list('status', flat=True).first()
+                    if job_status not in (ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING):
+                        break
+                    if time.perf_counter() > deadline:
+                        self.stderr.write(
+                            f'Upload job {job_id} still {job_status} after {timeout}s; '
+                            f'rows it merges later are not cleaned up.'
+                        )
+                        job_status = 'timed_out'
+                        break
+                    time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+            samples.append({
+                'status': response.status_code, 'seconds': elapsed, 'accepted_seconds': accepted,
+                'job_status': job_status, 'bytes': len(upload), 'rows': rows, 'db_ms': None, 'queries': None,
+            })
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM employees WHERE email LIKE %s', [f'%@{UPLOAD_DOMAIN}'])
+        removed = 0
+        if created_department:
+            removed += Department.objects.filter(name=UPLOAD_DEPARTMENT).delete()[0]
+        if created_position:
+            removed += Position.objects.filter(title=UPLOAD_POSITION).delete()[0]
+        if removed:
+            bump_dimension_version()
+        # The import jobs refreshed the summary views with these rows in them.
+        refresh_employee_stats()
+        bump_data_version()
+
+        result = self.summarize('upload_csv', samples)
+        result.update({
+            'rows': rows,
+            'rows_per_second': rows / statistics.median(s['seconds'] for s in samples),
+            'accepted_ms_p50': statistics.median(s['accepted_seconds'] for s in samples) * 1000,
+            'job_statuses': sorted({s['job_status'] for s in samples if s['job_status']}),
+        })
+        return result
+
+    @staticmethod
+    def summarize(name, samples):
+        latencies = sorted(s['seconds'] * 1000 for s in samples)
+        db_times = [s['db_ms'] for s in samples if s['db_ms'] is not None]
+        queries = [s['queries'] for s in samples if s['queries'] is not None]
+        return {
+            'name': name,
+            'samples': len(samples),
+            'statuses': sorted({s['status'] for s in samples}),
+            'latency_ms': {
+                'min': latencies[0],
+                'p50': statistics.median(latencies),
+                'p95': latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))],
+                'max': latencies[-1],
+                'mean': statistics.fmean(latencies),
+            },
+            'db_ms_p50': statistics.median(db_times) if db_times else None,
+            'queries_p50': statistics.median(queries) if queries else None,
+            'bytes_p50': statistics.median(s['bytes'] for s in samples),
+        }
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
+
+    @staticmethod
+    def server_version():
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW server_version')
+            return cursor.fetchone()[0]
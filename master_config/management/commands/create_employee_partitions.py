@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from master_config.partitioning import TABLE, create_future_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the yearly employees partitions up to --years-ahead years out, so new joining '
+        'dates never land in the default partition. Safe to run repeatedly, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years-ahead', type=int, default=2)
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError(f'{TABLE} is not partitioned; run partition_employees first.')
+
+        created = create_future_partitions(options['years_ahead'])
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'Created {", ".join(created)}.'))
+        else:
+            self.stdout.write('All partitions already exist.')
@@ -0,0 +1,145 @@
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from master_config.caching import bump_data_version
+from master_config.dimensions import bump_dimension_version
+from master_config.stats import refresh_employee_stats
+
+
+FIRST_NAMES = np.array([
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rohan', 'Isha',
+])
+LAST_NAMES = np.array([
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Ranjan',
+])
+LOCATIONS = ['Mumbai', 'Delhi', 'Bengaluru', 'Pune', 'Hyderabad', 'Chennai', 'Kolkata']
+
+EMPLOYEE_COLUMNS = [
+    'first_name', 'last_name', 'email', 'phone_number', 'date_of_birth', 'date_of_joining',
+    'salary', 'department_id', 'position_id', 'created_at', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic departments, positions and employees with COPY for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=1_000_000)
+        parser.add_argument('--departments', type=int, default=50)
+        parser.add_argument('--positions', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=250_000)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed and batch size, same data.')
+        parser.add_argument(
+            '--truncate', action='store_true',
+            help='Delete all existing employees, departments and positions first.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        if options['truncate']:
+            with connection.cursor() as cursor:
+                cursor.execute('TRUNCATE employees, departments, positions RESTART IDENTITY CASCADE')
+            # Ids are handed out again from 1; no worker may keep mapping
+            # them to the old names.
+            bump_dimension_version()
+
+        department_ids = self.ensure_dimension(
+            'departments', 'name', [f'Department {i:04d}' for i in range(options['departments'])],
+            extra_columns={'location': lambda i: LOCATIONS[i % len(LOCATIONS)]}
+        )
+        position_ids = self.ensure_dimension(
+            'positions', 'title', [f'Position {i:04d}' for i in range(options['positions'])]
+        )
+
+        total = options['employees']
+        written = 0
+        try:
+            while written < total:
+                size = min(options['batch_size'], total - written)
+                frame = self.employee_batch(written, size, options['seed'], department_ids, position_ids)
+                self.copy_batch(frame)
+                written += size
+                self.stdout.write(f'{written}/{total} employees written')
+        except IntegrityError as e:
+            raise CommandError(
+                f'{e}. These rows already exist; rerun with --truncate or a different --seed.'
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE departments, positions, employees')
+        refresh_employee_stats()
+        bump_data_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total} employees in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s).'
+        ))
+
+    def ensure_dimension(self, table, column, values, extra_columns=None):
+        extra_columns = extra_columns or {}
+        now = timezone.now()
+        columns = [column, *extra_columns, 'created_at']
+        rows = [
+            [value, *(build(i) for build in extra_columns.values()), now]
+            for i, value in enumerate(values)
+        ]
+        placeholders = ', '.join(['%s'] * len(columns))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders}) '
+                f'ON CONFLICT ({column}) DO NOTHING',
+                rows
+            )
+            inserted = cursor.rowcount > 0
+            cursor.execute(f'SELECT id FROM {table} WHERE {column} = ANY(%s) ORDER BY id', [values])
+            ids = np.array([row[0] for row in cursor.fetchall()])
+        if inserted:
+            bump_dimension_version()
+        return ids
+
+    def employee_batch(self, offset, size, seed, department_ids, position_ids):
+        rng = np.random.default_rng([seed, offset])
+        index = np.arange(offset, offset + size)
+        # Names come from the row number so a given row always gets the same
+        # email, whatever the batch size, and reruns collide instead of
+        # silently adding near-duplicates.
+        mixed = (index * 2654435761 + seed) % (2 ** 32)
+        first = FIRST_NAMES[mixed % len(FIRST_NAMES)]
+        last = LAST_NAMES[(mixed // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        born = np.datetime64('1960-01-01') + rng.integers(0, 365 * 43, size).astype('timedelta64[D]')
+        joined = np.datetime64('2010-01-01') + rng.integers(0, 365 * 16, size).astype('timedelta64[D]')
+        now = timezone.now().isoformat()
+
+        frame = pd.DataFrame({
+            'first_name': first,
+            'last_name': last,
+            'email': pd.Series(np.char.lower(first)) + '.' + pd.Series(np.char.lower(last)) + '.'
+                     + pd.Series(index).astype(str) + f'.s{seed}@example.com',
+            'phone_number': pd.Series(rng.integers(6_000_000_000, 9_999_999_999, size)).astype(str),
+            'date_of_birth': born.astype(str),
+            'date_of_joining': joined.astype(str),
+            'salary': rng.integers(25_000_00, 250_000_00, size) / 100,
+            'department_id': rng.choice(department_ids, size),
+            'position_id': rng.choice(position_ids, size),
+            'created_at': now,
+            'updated_at': now,
+        })
+        return frame[EMPLOYEE_COLUMNS]
+
+    def copy_batch(self, frame):
+        buffer = io.StringIO()
+        frame.to_csv(buffer, header=False, index=False, float_format='%.2f')
+        buffer.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY employees ({", ".join(EMPLOYEE_COLUMNS)}) FROM STDIN WITH CSV', buffer)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from master_config.caching import bump_data_version
+from master_config.partitioning import TABLE, convert_to_partitioned, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the employees table into one range-partitioned by joining year. Runs in a single '
+        'transaction that blocks writes to employees until it commits; there is no automatic way back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years-ahead', type=int, default=2,
+            help='Also create partitions for this many years after the current one.'
+        )
+        parser.add_argument(
+            '--years-back', type=int, default=10,
+            help='Also create partitions for this many years before the current one. Rows joining '
+                 'earlier stay in the default partition.'
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor):
+                raise CommandError(f'{TABLE} is already partitioned.')
+
+        started = time.perf_counter()
+        convert_to_partitioned(options['years_ahead'], options['years_back'])
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Partitioned {TABLE} by joining year in {time.perf_counter() - started:.1f}s.'
+        ))
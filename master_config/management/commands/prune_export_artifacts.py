@@ -0,0 +1,96 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from master_config.caching import get_data_version
+from master_config.export_artifacts import TEMP_SUFFIX, artifact_version
+from master_config.models import ImportJob
+from master_config.validation import PART_SUFFIX, rejects_job_id
+
+
+def list_files(root):
+    if not os.path.isdir(root):
+        return []
+    with os.scandir(root) as entries:
+        return [(entry, entry.stat()) for entry in entries if entry.is_file()]
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored export artifacts built for an older employee data version, '
+        'artifacts and import rejects older than --max-age, rejects left by uploads '
+        'that never became a job, and abandoned partial files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.EXPORT_ARTIFACT_MAX_AGE,
+            help='Delete any artifact or rejects file older than this many seconds.'
+        )
+        parser.add_argument(
+            '--grace', type=int, default=300,
+            help='Keep outdated artifacts, orphaned rejects and partial files younger than this many seconds.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        artifacts = list_files(settings.EXPORT_ARTIFACT_ROOT)
+        rejects = list_files(settings.IMPORT_REJECTS_ROOT)
+        if not artifacts and not rejects:
+            self.stdout.write('No export artifacts or import rejects found.')
+            return
+
+        now = time.time()
+        stale = self.stale_artifacts(artifacts, now, options) + self.stale_rejects(rejects, now, options)
+        removed = 0
+        freed = 0
+
+        for entry, stat in stale:
+            if options['dry_run']:
+                self.stdout.write(f'Would delete {entry.name}')
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            removed += 1
+            freed += stat.st_size
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {removed} file(s), {freed} bytes.'))
+
+    def stale_artifacts(self, files, now, options):
+        current_version = get_data_version() if files else None
+        stale = []
+        for entry, stat in files:
+            age = now - stat.st_mtime
+            if entry.name.endswith(TEMP_SUFFIX):
+                if age > options['grace']:
+                    stale.append((entry, stat))
+                continue
+            version = artifact_version(entry.name)
+            if version is None:
+                continue
+            if age > options['max_age'] or (version != current_version and age > options['grace']):
+                stale.append((entry, stat))
+        return stale
+
+    def stale_rejects(self, files, now, options):
+        owned = [(entry, stat, rejects_job_id(entry.name)) for entry, stat in files]
+        job_ids = {job_id for _, _, job_id in owned if job_id}
+        jobs = set(ImportJob.objects.filter(pk__in=job_ids).values_list('pk', flat=True)) if job_ids else set()
+        stale = []
+        for entry, stat, job_id in owned:
+            if job_id is None:
+                continue
+            age = now - stat.st_mtime
+            # Parts are only joined once the whole upload is in, however
+            # long that takes; a finished rejects file without a job was
+            # left by an upload that was turned away.
+            if age > options['max_age'] or (
+                not entry.name.endswith(PART_SUFFIX) and job_id not in jobs and age > options['grace']
+            ):
+                stale.append((entry, stat))
+        return stale
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from master_config.caching import bump_data_version
+from master_config.stats import STATS_VIEWS, refresh_employee_stats
+
+
+class Command(BaseCommand):
+    help = 'Refresh the materialized views behind apiV1/employee-stats/.'
+
+    def handle(self, *args, **options):
+        refresh_employee_stats()
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {", ".join(STATS_VIEWS)}.'))
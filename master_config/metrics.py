@@ -0,0 +1,204 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.http import HttpResponse
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rows_streamed = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={self.elapsed() * 1000:.1f}',
+        ])
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class MetricsRegistry:
+    """
+    In-process aggregates per endpoint. Each worker process keeps its own
+    registry, so Prometheus should scrape every worker (or sum by instance).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.durations = {}
+        self.query_counts = {}
+        self.query_durations = {}
+        self.cache_hits = defaultdict(int)
+        self.cache_misses = defaultdict(int)
+        self.rows_streamed = defaultdict(int)
+
+    def record(self, endpoint, method, status, metrics):
+        key = (endpoint, method)
+        with self.lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            self.durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(metrics.elapsed())
+            self.query_counts.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(metrics.db_queries)
+            self.query_durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(metrics.db_time)
+            self.cache_hits[key] += metrics.cache_hits
+            self.cache_misses[key] += metrics.cache_misses
+            self.rows_streamed[key] += metrics.rows_streamed
+
+    def render(self):
+        lines = []
+        with self.lock:
+            self.render_counter(
+                lines, 'http_requests_total', 'Requests handled.',
+                self.requests, ('endpoint', 'method', 'status')
+            )
+            self.render_histogram(
+                lines, 'http_request_duration_seconds', 'Time to last byte.', self.durations
+            )
+            self.render_histogram(
+                lines, 'db_queries_per_request', 'SQL queries per request.', self.query_counts
+            )
+            self.render_histogram(
+                lines, 'db_query_duration_seconds', 'SQL time per request.', self.query_durations
+            )
+            self.render_counter(lines, 'cache_hits_total', 'Cache lookups that hit.', self.cache_hits)
+            self.render_counter(lines, 'cache_misses_total', 'Cache lookups that missed.', self.cache_misses)
+            self.render_counter(lines, 'rows_streamed_total', 'CSV rows streamed in export bodies.', self.rows_streamed)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(names, values, extra=''):
+        pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}'
+
+    def render_counter(self, lines, name, help_text, values, label_names=('endpoint', 'method')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for key, value in sorted(values.items()):
+            lines.append(f'{name}{self.labels(label_names, key)} {value}')
+
+    def render_histogram(self, lines, name, help_text, histograms, label_names=('endpoint', 'method')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                bucket = f'le="{bound}"'
+                lines.append(f'{name}_bucket{self.labels(label_names, key, bucket)} {cumulative}')
+            lines.append(f'{name}_sum{self.labels(label_names, key)} {histogram.total}')
+            lines.append(f'{name}_count{self.labels(label_names, key)} {cumulative}')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def record_cache_lookup(hit):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def count_records(chunk, quoted):
+    """
+    Records ended in a piece of CSV, and whether it stops inside a quoted
+    field. Newlines in quoted fields are data, not record ends; escaped
+    quotes are doubled, so they never change which side of a quote we are.
+    """
+    quote, newline = (b'"', b'\n') if isinstance(chunk, bytes) else ('"', '\n')
+    if not quoted and quote not in chunk:
+        return chunk.count(newline), False
+    records = 0
+    for index, part in enumerate(chunk.split(quote)):
+        if index:
+            quoted = not quoted
+        if not quoted:
+            records += part.count(newline)
+    return records, quoted
+
+
+def count_rows(chunks, metrics, header_rows=1):
+    """Passes a CSV body through, counting its data rows."""
+    skip = header_rows
+    quoted = False
+    for chunk in chunks:
+        lines, quoted = count_records(chunk, quoted)
+        counted = max(lines - skip, 0)
+        skip = max(skip - lines, 0)
+        metrics.rows_streamed += counted
+        yield chunk
+
+
+async def acount_rows(chunks, metrics, header_rows=1):
+    skip = header_rows
+    quoted = False
+    async for chunk in chunks:
+        lines, quoted = count_records(chunk, quoted)
+        counted = max(lines - skip, 0)
+        skip = max(skip - lines, 0)
+        metrics.rows_streamed += counted
+        yield chunk
+
+
+def count_streamed_rows(response):
+    """Counts the rows of an uncompressed export body for the current request."""
+    metrics = current_metrics.get()
+    if metrics is not None and response.streaming:
+        # Partial responses start mid-file, so there is no header to skip,
+        # and one starting inside a quoted field is counted approximately.
+        header_rows = 0 if response.status_code == 206 else 1
+        count = acount_rows if response.is_async else count_rows
+        response.streaming_content = count(response.streaming_content, metrics, header_rows)
+    return response
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
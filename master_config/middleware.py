@@ -0,0 +1,169 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from master_config.metrics import RequestMetrics, current_metrics, registry
+from master_config.routers import PIN_COOKIE, ReadState, pin_key, read_state
+
+
+STREAM_BATCH_SIZE = 64 * 1024
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request and counts its SQL queries, cache lookups and
+    streamed rows. The totals go into a ``Server-Timing`` header and the
+    per-endpoint histograms served by ``apiV1/metrics/``.
+
+    ``Server-Timing`` is sent with the headers, so for streaming responses
+    it covers the work done before the body starts; the histograms are
+    recorded once the body has been sent in full.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        response = self.get_response(request)
+        return self.process_metrics(request, response, metrics, token)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        response = await self.get_response(request)
+        return self.process_metrics(request, response, metrics, token)
+
+    def process_metrics(self, request, response, metrics, token):
+        response['Server-Timing'] = metrics.server_timing()
+
+        endpoint = self.endpoint(request)
+        if endpoint is None:
+            current_metrics.reset(token)
+            return response
+
+        def record():
+            registry.record(endpoint, request.method, response.status_code, metrics)
+
+        if response.streaming:
+            # The body is produced after this returns, so queries it runs
+            # still need to find the metrics in the context.
+            finish = self.afinish_stream if response.is_async else self.finish_stream
+            response.streaming_content = finish(response.streaming_content, record)
+        else:
+            current_metrics.reset(token)
+            record()
+        return response
+
+    @staticmethod
+    def endpoint(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name == 'metrics':
+            return None
+        return match.route
+
+    @staticmethod
+    def finish_stream(chunks, record):
+        try:
+            yield from chunks
+        finally:
+            record()
+
+    @staticmethod
+    async def afinish_stream(chunks, record):
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            record()
+
+
+def next_batch(iterator):
+    parts = []
+    size = 0
+    for part in iterator:
+        parts.append(part)
+        size += len(part)
+        if size >= STREAM_BATCH_SIZE:
+            break
+    return b''.join(parts)
+
+
+async def iterate_in_thread(chunks):
+    # Thread-sensitive calls run on the request's own thread, which is the
+    # one that opened any database cursor the body is still reading from.
+    take = sync_to_async(next_batch)
+    iterator = iter(chunks)
+    while True:
+        batch = await take(iterator)
+        if not batch:
+            break
+        yield batch
+
+
+class SyncStreamingMiddleware:
+    """
+    Under ASGI, Django reads a synchronous streaming body to the end before
+    sending any of it. This hands such bodies to the server in batches
+    instead, so the sync export views keep streaming behind uvicorn workers.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = iterate_in_thread(response.streaming_content)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the database router send this request's employee reads to a
+    replica, unless the client has an import running or just finished one
+    and so must read its own writes from the primary.
+
+    The state is left in the context so that streamed bodies, produced
+    after this returns, are routed the same way.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if settings.DATABASE_REPLICAS:
+            token = request.COOKIES.get(PIN_COOKIE)
+            read_state.set(ReadState(pinned=bool(token and cache.get(pin_key(token)))))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if settings.DATABASE_REPLICAS:
+            token = request.COOKIES.get(PIN_COOKIE)
+            read_state.set(ReadState(pinned=bool(token and await cache.aget(pin_key(token)))))
+        return await self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master_config', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='employee',
+            name='employees_date_of_e463b2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['-date_of_joining', '-id'], name='employees_date_of_f95741_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master_config', '0004_import_job'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            SET CONSTRAINTS ALL IMMEDIATE;
+
+            UPDATE employees e
+            SET department_id = keep.id
+            FROM departments d
+            JOIN (SELECT name, MIN(id) AS id FROM departments GROUP BY name) keep ON keep.name = d.name
+            WHERE e.department_id = d.id AND d.id <> keep.id;
+
+            DELETE FROM departments d
+            USING departments keep
+            WHERE keep.name = d.name AND keep.id < d.id;
+
+            UPDATE employees e
+            SET position_id = keep.id
+            FROM positions p
+            JOIN (SELECT title, MIN(id) AS id FROM positions GROUP BY title) keep ON keep.title = p.title
+            WHERE e.position_id = p.id AND p.id <> keep.id;
+
+            DELETE FROM positions p
+            USING positions keep
+            WHERE keep.title = p.title AND keep.id < p.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RemoveIndex(
+            model_name='department',
+            name='departments_name_c59a45_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='position',
+            name='positions_title_94e831_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='department',
+            constraint=models.UniqueConstraint(fields=('name',), name='departments_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='position',
+            constraint=models.UniqueConstraint(fields=('title',), name='positions_title_uniq'),
+        ),
+    ]
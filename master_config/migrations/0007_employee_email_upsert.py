@@ -0,0 +1,113 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:30
+
+import logging
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+logger = logging.getLogger(__name__)
+
+# Rows removed so email can be made unique, kept for review or restoring.
+ARCHIVE_TABLE = 'employees_email_duplicates'
+
+
+def drop_invalid_email_index(apps, schema_editor):
+    # A concurrent build that failed, e.g. because a duplicate was inserted
+    # after the cleanup below, leaves an INVALID index behind that
+    # CREATE INDEX IF NOT EXISTS would then skip.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = 'employees_email_uniq'"
+        )
+        row = cursor.fetchone()
+    if row and row[0]:
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS "employees_email_uniq"')
+
+
+def archive_duplicate_emails(apps, schema_editor):
+    """Moves every employee but the newest per email into ``ARCHIVE_TABLE``."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} '
+            f'(LIKE employees, archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())'
+        )
+        cursor.execute(f"""
+        WITH removed AS (
+            DELETE FROM employees e
+            USING employees newer
+            WHERE newer.email = e.email AND newer.id > e.id
+            RETURNING e.*
+        )
+        INSERT INTO {ARCHIVE_TABLE} SELECT * FROM removed
+        """)
+        if cursor.rowcount:
+            logger.warning(
+                'Moved %s employees with a duplicate email to %s', cursor.rowcount, ARCHIVE_TABLE
+            )
+
+
+def restore_duplicate_emails(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [ARCHIVE_TABLE])
+        if not cursor.fetchone()[0]:
+            return
+        cursor.execute(
+            "SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) FROM pg_attribute "
+            "WHERE attrelid = 'employees'::regclass AND attnum > 0 AND NOT attisdropped"
+        )
+        columns = cursor.fetchone()[0]
+        cursor.execute(f'INSERT INTO employees ({columns}) SELECT {columns} FROM {ARCHIVE_TABLE}')
+        cursor.execute(f'DROP TABLE {ARCHIVE_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('master_config', '0006_unique_department_position_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='employees_unchanged',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='employees_updated',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(choices=[('insert', 'Insert'), ('upsert', 'Upsert')], default='insert', max_length=10),
+        ),
+        migrations.RunPython(drop_invalid_email_index, migrations.RunPython.noop),
+        migrations.RunPython(archive_duplicate_emails, restore_duplicate_emails),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "employees_email_uniq" ON "employees" ("email");',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "employees_email_uniq";',
+                ),
+                migrations.RunSQL(
+                    sql='ALTER TABLE "employees" ADD CONSTRAINT "employees_email_uniq" UNIQUE USING INDEX "employees_email_uniq";',
+                    reverse_sql='ALTER TABLE "employees" DROP CONSTRAINT "employees_email_uniq";',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='employee',
+                    constraint=models.UniqueConstraint(fields=('email',), name='employees_email_uniq'),
+                ),
+            ],
+        ),
+        RemoveIndexConcurrently(
+            model_name='employee',
+            name='employees_email_f66e96_idx',
+        ),
+    ]
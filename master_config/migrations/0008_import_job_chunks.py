@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master_config', '0007_employee_email_upsert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='chunks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('partial', 'Completed with errors'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
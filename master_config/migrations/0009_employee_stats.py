@@ -0,0 +1,104 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master_config', '0008_import_job_chunks'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            CREATE MATERIALIZED VIEW employee_stats_department AS
+            SELECT d.id AS department_id, d.name AS department_name,
+                   COALESCE(s.headcount, 0) AS headcount,
+                   COALESCE(s.salary_total, 0) AS salary_total,
+                   s.salary_avg, s.salary_min, s.salary_max
+            FROM departments d
+            LEFT JOIN (
+                SELECT department_id, count(*) AS headcount, sum(salary) AS salary_total,
+                       round(avg(salary), 2) AS salary_avg, min(salary) AS salary_min, max(salary) AS salary_max
+                FROM employees
+                GROUP BY department_id
+            ) s ON s.department_id = d.id;
+            CREATE UNIQUE INDEX employee_stats_department_pk ON employee_stats_department (department_id);
+
+            CREATE MATERIALIZED VIEW employee_stats_position AS
+            SELECT p.id AS position_id, p.title AS position_title,
+                   COALESCE(s.headcount, 0) AS headcount,
+                   COALESCE(s.salary_total, 0) AS salary_total,
+                   s.salary_avg, s.salary_min, s.salary_max
+            FROM positions p
+            LEFT JOIN (
+                SELECT position_id, count(*) AS headcount, sum(salary) AS salary_total,
+                       round(avg(salary), 2) AS salary_avg, min(salary) AS salary_min, max(salary) AS salary_max
+                FROM employees
+                GROUP BY position_id
+            ) s ON s.position_id = p.id;
+            CREATE UNIQUE INDEX employee_stats_position_pk ON employee_stats_position (position_id);
+
+            CREATE MATERIALIZED VIEW employee_stats_monthly_joining AS
+            SELECT date_trunc('month', date_of_joining)::date AS month,
+                   count(*) AS headcount, round(avg(salary), 2) AS salary_avg
+            FROM employees
+            GROUP BY 1;
+            CREATE UNIQUE INDEX employee_stats_monthly_joining_pk ON employee_stats_monthly_joining (month);
+            """,
+            reverse_sql="""
+            DROP MATERIALIZED VIEW IF EXISTS employee_stats_monthly_joining;
+            DROP MATERIALIZED VIEW IF EXISTS employee_stats_position;
+            DROP MATERIALIZED VIEW IF EXISTS employee_stats_department;
+            """,
+        ),
+        migrations.CreateModel(
+            name='DepartmentStats',
+            fields=[
+                ('department', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='master_config.department')),
+                ('department_name', models.CharField(max_length=100)),
+                ('headcount', models.BigIntegerField()),
+                ('salary_total', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('salary_avg', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('salary_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('salary_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'db_table': 'employee_stats_department',
+                'ordering': ['department_name'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyJoiningStats',
+            fields=[
+                ('month', models.DateField(primary_key=True, serialize=False)),
+                ('headcount', models.BigIntegerField()),
+                ('salary_avg', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                'db_table': 'employee_stats_monthly_joining',
+                'ordering': ['month'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PositionStats',
+            fields=[
+                ('position', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='master_config.position')),
+                ('position_title', models.CharField(max_length=100)),
+                ('headcount', models.BigIntegerField()),
+                ('salary_total', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('salary_avg', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('salary_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('salary_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'db_table': 'employee_stats_position',
+                'ordering': ['position_title'],
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+def concurrently(schema_editor, model):
+    # Postgres can't build or drop indexes on a partitioned table
+    # concurrently (see the partition_employees command).
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind <> 'p' FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+# Indexes Django created for the department and position foreign keys.
+FOREIGN_KEY_INDEXES = {
+    'employees_department_id_e0a596e3': 'department_id',
+    'employees_position_id_ae4fa2b1': 'position_id',
+}
+
+
+def drop_foreign_key_indexes(apps, schema_editor):
+    # Only the indexes: AlterField would also drop and re-validate the
+    # foreign key constraints, scanning the whole table.
+    option = 'CONCURRENTLY ' if concurrently(schema_editor, apps.get_model('master_config', 'Employee')) else ''
+    for name in FOREIGN_KEY_INDEXES:
+        schema_editor.execute(f'DROP INDEX {option}IF EXISTS "{name}"')
+
+
+def create_foreign_key_indexes(apps, schema_editor):
+    option = 'CONCURRENTLY ' if concurrently(schema_editor, apps.get_model('master_config', 'Employee')) else ''
+    for name, column in FOREIGN_KEY_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {option}IF NOT EXISTS "{name}" ON "employees" ("{column}")')
+
+
+class AddEmployeeIndex(AddIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=concurrently(schema_editor, model))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=concurrently(schema_editor, model))
+
+
+class RemoveEmployeeIndex(RemoveIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, concurrently=concurrently(schema_editor, model))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.add_index(model, index, concurrently=concurrently(schema_editor, model))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('master_config', '0009_employee_stats'),
+    ]
+
+    # The composite indexes are built before the single-column ones they
+    # replace are dropped, so department and position lookups stay indexed.
+    operations = [
+        AddEmployeeIndex(
+            model_name='employee',
+            index=models.Index(fields=['department', '-date_of_joining', '-id'], name='employees_dept_joining_idx'),
+        ),
+        AddEmployeeIndex(
+            model_name='employee',
+            index=models.Index(fields=['position', '-date_of_joining', '-id'], name='employees_pos_joining_idx'),
+        ),
+        AddEmployeeIndex(
+            model_name='employee',
+            index=models.Index(fields=['department', 'position', '-date_of_joining', '-id'], name='employees_dept_pos_joining_idx'),
+        ),
+        RemoveEmployeeIndex(
+            model_name='employee',
+            name='employees_departm_24ab5f_idx',
+        ),
+        RemoveEmployeeIndex(
+            model_name='employee',
+            name='employees_positio_2577e6_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_foreign_key_indexes, create_foreign_key_indexes),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='employee',
+                    name='department',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='employees_department', to='master_config.department'),
+                ),
+                migrations.AlterField(
+                    model_name='employee',
+                    name='position',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='employees_position', to='master_config.position'),
+                ),
+            ],
+        ),
+    ]
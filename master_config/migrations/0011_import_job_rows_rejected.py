@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('master_config', '0010_employee_filter_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_rejected',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
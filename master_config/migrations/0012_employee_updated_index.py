@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+from master_config.operations import AddEmployeeIndex
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('master_config', '0011_import_job_rows_rejected'),
+    ]
+
+    operations = [
+        AddEmployeeIndex(
+            model_name='employee',
+            index=models.Index(fields=['updated_at', 'id'], name='employees_updated_idx'),
+        ),
+    ]
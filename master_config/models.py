@@ -1,4 +1,8 @@
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class Department(models.Model):
@@ -10,8 +14,8 @@ class Department(models.Model):
         return self.name
     
     class Meta:
-        indexes = [
-            models.Index(fields=['name']),
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='departments_name_uniq'),
         ]
         db_table = 'departments'
 
@@ -24,8 +28,8 @@ class Position(models.Model):
         return self.title
     
     class Meta:
-        indexes = [
-            models.Index(fields=['title']),
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='positions_title_uniq'),
         ]
         db_table = 'positions'
 
@@ -38,8 +42,13 @@ class Employee(models.Model):
     date_of_birth = models.DateField()
     date_of_joining = models.DateField()
     salary = models.DecimalField(max_digits=10, decimal_places=2)
-    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='employees_department')
-    position = models.ForeignKey(Position, on_delete=models.CASCADE, related_name='employees_position')
+    # Indexed through the composite indexes below, which lead with these columns.
+    department = models.ForeignKey(
+        Department, on_delete=models.CASCADE, related_name='employees_department', db_index=False
+    )
+    position = models.ForeignKey(
+        Position, on_delete=models.CASCADE, related_name='employees_position', db_index=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,11 +58,124 @@ class Employee(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['first_name', 'last_name']),
-            models.Index(fields=['email']),
             models.Index(fields=['phone_number']),
-            models.Index(fields=['date_of_joining']),
-            models.Index(fields=['department']),
-            models.Index(fields=['position']),
+            models.Index(fields=['-date_of_joining', '-id']),
+            # Every list and export orders by -date_of_joining (and -id for
+            # cursors) after filtering by department and/or position, so
+            # these hand back rows already in order, no sort needed.
+            models.Index(fields=['department', '-date_of_joining', '-id'], name='employees_dept_joining_idx'),
+            models.Index(fields=['position', '-date_of_joining', '-id'], name='employees_pos_joining_idx'),
+            models.Index(
+                fields=['department', 'position', '-date_of_joining', '-id'], name='employees_dept_pos_joining_idx'
+            ),
+            # Delta exports read rows changed after a watermark in this order.
+            models.Index(fields=['updated_at', 'id'], name='employees_updated_idx'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='employees_first_name_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='employees_last_name_trgm'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='employees_email_trgm'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['email'], name='employees_email_uniq'),
         ]
         ordering = ['-date_of_joining']
-        db_table = 'employees'
\ No newline at end of file
+        db_table = 'employees'
+
+
+class ImportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_PARTIAL = 'partial'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_PARTIAL, 'Completed with errors'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    MODE_INSERT = 'insert'
+    MODE_UPSERT = 'upsert'
+    MODE_CHOICES = [
+        (MODE_INSERT, 'Insert'),
+        (MODE_UPSERT, 'Upsert'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=MODE_INSERT)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_total = models.PositiveBigIntegerField(null=True, blank=True)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+    employees_created = models.PositiveBigIntegerField(default=0)
+    employees_updated = models.PositiveBigIntegerField(default=0)
+    employees_unchanged = models.PositiveBigIntegerField(default=0)
+    chunks = models.JSONField(default=list, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+        ordering = ['-created_at']
+        db_table = 'import_jobs'
+
+
+class DepartmentStats(models.Model):
+    """Row of the ``employee_stats_department`` materialized view."""
+
+    department = models.OneToOneField(
+        Department, on_delete=models.DO_NOTHING, primary_key=True, related_name='stats'
+    )
+    department_name = models.CharField(max_length=100)
+    headcount = models.BigIntegerField()
+    salary_total = models.DecimalField(max_digits=20, decimal_places=2)
+    salary_avg = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    salary_min = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    salary_max = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        managed = False
+        ordering = ['department_name']
+        db_table = 'employee_stats_department'
+
+
+class PositionStats(models.Model):
+    """Row of the ``employee_stats_position`` materialized view."""
+
+    position = models.OneToOneField(
+        Position, on_delete=models.DO_NOTHING, primary_key=True, related_name='stats'
+    )
+    position_title = models.CharField(max_length=100)
+    headcount = models.BigIntegerField()
+    salary_total = models.DecimalField(max_digits=20, decimal_places=2)
+    salary_avg = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    salary_min = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    salary_max = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        managed = False
+        ordering = ['position_title']
+        db_table = 'employee_stats_position'
+
+
+class MonthlyJoiningStats(models.Model):
+    """Row of the ``employee_stats_monthly_joining`` materialized view."""
+
+    month = models.DateField(primary_key=True)
+    headcount = models.BigIntegerField()
+    salary_avg = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        managed = False
+        ordering = ['month']
+        db_table = 'employee_stats_monthly_joining'
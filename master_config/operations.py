@@ -0,0 +1,29 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+
+
+# Index operations for later employees migrations. They build and drop
+# indexes concurrently while the table is a plain one.
+
+
+def concurrently(schema_editor, model):
+    # Postgres can't build or drop indexes on a partitioned table
+    # concurrently (see the partition_employees command).
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind <> 'p' FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+class AddEmployeeIndex(AddIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=concurrently(schema_editor, model))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=concurrently(schema_editor, model))
+
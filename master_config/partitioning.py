@@ -0,0 +1,169 @@
+import datetime
+import re
+
+from django.db import connection, transaction
+
+from master_config.models import Employee
+from master_config.stats import STATS_VIEWS
+
+
+TABLE = Employee._meta.db_table
+PARTITION_KEY = 'date_of_joining'
+DEFAULT_PARTITION = f'{TABLE}_default'
+STAGING_TABLE = f'{TABLE}_partitioned'
+
+# Any value works as long as nothing else takes the same advisory lock.
+EMAIL_LOCK_KEY = 0x656D706C
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0]
+
+
+def partition_bounds(year):
+    """``(start, end)`` of the partition for ``year``; ``end`` is None for an open (MAXVALUE) top."""
+    if year == datetime.MAXYEAR:
+        return datetime.date(year, 1, 1), None
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+
+def partition_years(years_back, years_ahead):
+    """The years with their own partition, from ``years_back`` before the current year to ``years_ahead`` after."""
+    this_year = datetime.date.today().year
+    return range(max(this_year - years_back, datetime.MINYEAR), min(this_year + years_ahead, datetime.MAXYEAR) + 1)
+
+
+def existing_partitions(cursor):
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass',
+        [TABLE]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition(cursor, year, parent=TABLE):
+    """
+    Adds the partition for ``year``. Rows for that year already sitting in
+    the default partition are moved into it; Postgres refuses to attach a
+    partition whose range the default partition still holds rows for.
+    """
+    start, end = partition_bounds(year)
+    name = partition_name(year)
+    in_range = f'{PARTITION_KEY} >= %s' + ('' if end is None else f' AND {PARTITION_KEY} < %s')
+    params = [start] if end is None else [start, end]
+    create = (
+        f'CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO '
+        + ('(MAXVALUE)' if end is None else '(%s)')
+    )
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})', params)
+    if not cursor.fetchone()[0]:
+        cursor.execute(create, params)
+        return
+
+    cursor.execute(f'CREATE TEMPORARY TABLE moved_{year} (LIKE {parent}) ON COMMIT DROP')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) '
+        f'INSERT INTO moved_{year} SELECT * FROM moved',
+        params
+    )
+    cursor.execute(create, params)
+    cursor.execute(f'INSERT INTO {parent} SELECT * FROM moved_{year}')
+
+
+def create_future_partitions(years_ahead):
+    """Creates any missing partitions from the current year to ``years_ahead`` years out."""
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = existing_partitions(cursor)
+        for year in partition_years(0, years_ahead):
+            if partition_name(year) not in existing:
+                create_partition(cursor, year)
+                created.append(partition_name(year))
+    return created
+
+
+def with_partition_key(definition):
+    """Adds the partition key to a primary key or unique constraint definition."""
+    return re.sub(r'\)(\s*DEFERRABLE.*)?$', rf', {PARTITION_KEY})\1', definition)
+
+
+def convert_to_partitioned(years_ahead, years_back):
+    """
+    Rebuilds ``employees`` as a table range-partitioned by joining year, in
+    one transaction. Reads keep working until the final swap; writes wait.
+    Only the years from ``years_back`` before the current year to
+    ``years_ahead`` after get a partition; rows joining outside that window
+    stay in the default partition.
+
+    Postgres requires unique constraints on a partitioned table to include
+    the partition key, so the primary key becomes ``(id, date_of_joining)``
+    and ``employees_email_uniq`` becomes ``(email, date_of_joining)``. Email
+    uniqueness is from then on enforced by the importer, which merges under
+    an advisory lock. The stats views depend on the old table and are
+    recreated.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {TABLE} IN EXCLUSIVE MODE')
+
+        cursor.execute(
+            'SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f') ORDER BY contype DESC, conname",
+            [TABLE]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            'SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i '
+            'WHERE i.indrelid = %s::regclass '
+            'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)',
+            [TABLE]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        views = []
+        for view in STATS_VIEWS:
+            cursor.execute('SELECT pg_get_viewdef(%s::regclass)', [view])
+            definition = cursor.fetchone()[0]
+            cursor.execute('SELECT indexdef FROM pg_indexes WHERE tablename = %s', [view])
+            views.append((view, definition, [row[0] for row in cursor.fetchall()]))
+        for view in reversed(STATS_VIEWS):
+            cursor.execute(f'DROP MATERIALIZED VIEW {view}')
+
+        cursor.execute(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT last_value, is_called FROM {sequence}')
+        last_id, id_used = cursor.fetchone()
+
+        cursor.execute(
+            f'CREATE TABLE {STAGING_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({PARTITION_KEY})'
+        )
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {STAGING_TABLE} DEFAULT')
+        for year in partition_years(years_back, years_ahead):
+            create_partition(cursor, year, parent=STAGING_TABLE)
+
+        cursor.execute(f'INSERT INTO {STAGING_TABLE} SELECT * FROM {TABLE}')
+        cursor.execute(f'DROP TABLE {TABLE}')
+        cursor.execute(f'ALTER TABLE {STAGING_TABLE} RENAME TO {TABLE}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), %s, %s)", [last_id, id_used])
+
+        for name, kind, definition in constraints:
+            if kind in ('p', 'u'):
+                definition = with_partition_key(definition)
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+        for view, definition, view_indexes in views:
+            cursor.execute(f'CREATE MATERIALIZED VIEW {view} AS {definition}')
+            for definition in view_indexes:
+                cursor.execute(definition)
+
+        cursor.execute(f'ANALYZE {TABLE}')
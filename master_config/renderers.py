@@ -0,0 +1,30 @@
+import decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+
+def encode_default(obj):
+    # Same output as DRF's JSONEncoder for the types orjson leaves to us.
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def render_json(data):
+    return orjson.dumps(data, default=encode_default)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON renderer backed by orjson, which serializes dates natively in C."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return render_json(data)
@@ -0,0 +1,152 @@
+import contextvars
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+
+
+# Models whose reads may be served by a replica; everything else, including
+# import jobs that clients poll right after writing them, stays on the primary.
+REPLICA_MODELS = {
+    'master_config.employee',
+    'master_config.department',
+    'master_config.position',
+    'master_config.departmentstats',
+    'master_config.positionstats',
+    'master_config.monthlyjoiningstats',
+}
+
+WRITE_POSITION_KEY = 'employee_write_lsn'
+PIN_COOKIE = 'db_pin'
+PIN_WHILE_RUNNING = 6 * 60 * 60
+
+_replay_positions = {}
+
+read_state = contextvars.ContextVar('replica_read_state', default=None)
+
+
+def pin_key(token):
+    return f'replica_pin:{token}'
+
+
+def job_pin_key(job_id):
+    return f'replica_pin_job:{job_id}'
+
+
+def parse_lsn(lsn):
+    high, _, low = lsn.partition('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def record_write_position():
+    """
+    Stores the primary's current WAL position. Replicas are only read from
+    once they have replayed past it, so data written before the last data
+    version bump is never read, and cached, from a lagging replica.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return
+    if connections['default'].in_atomic_block:
+        # The commit record comes after the current position.
+        transaction.on_commit(record_write_position)
+        return
+    with connections['default'].cursor() as cursor:
+        cursor.execute('SELECT pg_current_wal_lsn()::text')
+        position = parse_lsn(cursor.fetchone()[0])
+    cache.set(WRITE_POSITION_KEY, position, None)
+
+
+def replay_position(alias):
+    """WAL position ``alias`` has replayed up to, or ``None`` if it is unreachable."""
+    now = time.monotonic()
+    checked = _replay_positions.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_CHECK_INTERVAL:
+        return checked[1]
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::text')
+            in_recovery, lsn = cursor.fetchone()
+    except DatabaseError:
+        position = None
+    else:
+        if not in_recovery:
+            # Not a streaming standby (e.g. a pooler in front of the primary):
+            # nothing to wait for.
+            position = math.inf
+        else:
+            position = parse_lsn(lsn) if lsn else None
+
+    _replay_positions[alias] = (now, position)
+    return position
+
+
+def choose_replica():
+    replicas = list(settings.DATABASE_REPLICAS)
+    if not replicas:
+        return None
+    required = cache.get(WRITE_POSITION_KEY) or 0
+    random.shuffle(replicas)
+    for alias in replicas:
+        position = replay_position(alias)
+        if position is not None and position >= required:
+            return alias
+    return None
+
+
+class ReadState:
+    """Routing decision for one request, made on its first replica read."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.chosen = False
+        self.alias = None
+
+    def replica(self):
+        if not self.chosen:
+            self.alias = choose_replica()
+            self.chosen = True
+        return self.alias
+
+
+def pin_client(token, job_id):
+    """Sends ``token``'s reads to the primary while its import runs."""
+    cache.set(pin_key(token), 1, PIN_WHILE_RUNNING)
+    cache.set(job_pin_key(job_id), token, PIN_WHILE_RUNNING)
+
+
+def extend_pin(job_id):
+    """Keeps the importing client on the primary for a while after the import."""
+    token = cache.get(job_pin_key(job_id))
+    if token is None:
+        return
+    cache.set(pin_key(token), 1, settings.REPLICA_PIN_SECONDS)
+    cache.delete(job_pin_key(job_id))
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads of employee data made while serving a request to a replica
+    that has caught up with the last write; all other reads, and every
+    write, go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = read_state.get()
+        if state is None or state.pinned or model._meta.label_lower not in REPLICA_MODELS:
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return state.replica() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
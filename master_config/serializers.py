@@ -1,9 +1,25 @@
+from django.urls import reverse
 from rest_framework import serializers
 
-from master_config.models import Employee
+from master_config.models import Employee, ImportJob
 
 
 class EmployeeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Employee
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rejects_url = serializers.SerializerMethodField()
+
+    def get_rejects_url(self, job):
+        if not job.rows_rejected:
+            return None
+        url = reverse('import-job-rejects', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    class Meta:
+        model = ImportJob
+        fields = '__all__'
@@ -0,0 +1,29 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from master_config.caching import bump_data_version
+from master_config.dimensions import bump_dimension_version
+from master_config.metrics import record_query
+from master_config.models import Department, Employee, Position
+
+
+# Receivers run in the order they are connected: names are reloaded before
+# pages are rebuilt under the new data version.
+@receiver([post_save, post_delete], sender=Department)
+@receiver([post_save, post_delete], sender=Position)
+def invalidate_dimensions(sender, **kwargs):
+    bump_dimension_version()
+
+
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=Department)
+@receiver([post_save, post_delete], sender=Position)
+def invalidate_employee_data(sender, **kwargs):
+    bump_data_version()
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
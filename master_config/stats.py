@@ -0,0 +1,19 @@
+from django.db import connection
+
+
+STATS_VIEWS = [
+    'employee_stats_department',
+    'employee_stats_position',
+    'employee_stats_monthly_joining',
+]
+
+
+def refresh_employee_stats():
+    """
+    Recomputes the workforce summary views. ``CONCURRENTLY`` keeps them
+    readable while the refresh runs; each view has the unique index this
+    requires.
+    """
+    with connection.cursor() as cursor:
+        for view in STATS_VIEWS:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{view}"')
@@ -1,3 +1,833 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+import orjson
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from master_config.async_views import export_values
+from master_config.caching import (
+    CachedEntry, acache_get_or_build, build_cache_key, bump_data_version, cache_get_or_build, lookup_entry,
+)
+from master_config.compression import compress_response
+from master_config.dimensions import departments, positions
+from master_config.export_artifacts import artifact_response, atee_to_artifact
+from master_config.export_csv_v3 import EmployeeExportAPIViewV3, export_copy_sql
+from master_config.filters import filter_employees
+from master_config.importer import (
+    StagingLoader, drop_staging_tables, drop_superseded_rows, resolve_names, run_import_job, staging_table_name,
+)
+from master_config.metrics import RequestMetrics, acount_rows, count_rows
+from master_config.models import Department, Employee, ImportJob, Position
+from master_config.stats import refresh_employee_stats
+from master_config.validation import parse_chunk, rejects_path, row_errors
+from master_config.views import LIST_FIELDS, EmployeeCursorPagination, EmployeeListAPIView, employee_values
+from master_config.watermarks import apply_delta, delta_since, delta_until, watermark_token
+
+
+# Tests that write data version, dimension or page keys keep them out of the
+# configured cache, which may be a shared Redis.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+FILTER_COMBINATIONS = [
+    {},
+    {'start_date': '2015-01-01', 'end_date': '2016-12-31'},
+    {'department': 'DEPARTMENT'},
+    {'position': 'POSITION'},
+    {'department': 'DEPARTMENT', 'position': 'POSITION'},
+    {'department': 'DEPARTMENT', 'start_date': '2015-01-01', 'end_date': '2016-12-31'},
+    {'position': 'POSITION', 'start_date': '2015-01-01', 'end_date': '2016-12-31'},
+    {'department': 'DEPARTMENT', 'position': 'POSITION', 'start_date': '2015-01-01', 'end_date': '2016-12-31'},
+]
+
+UNINDEXED_NODES = {'Seq Scan', 'Sort', 'Incremental Sort'}
+
+FILTER_COLUMNS = {
+    'start_date': 'date_of_joining',
+    'department': 'department_id',
+    'position': 'position_id',
+    'updated_since': 'updated_at',
+}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryPlanTests(TestCase):
+    """
+    EXPLAINs the queries the list and export views build for each filter
+    combination. Sequential scans and sorts are disabled for the planner,
+    so one that still shows up in a plan means no index can serve it, and
+    every filtered column has to be an index condition on the employees
+    scan rather than a filter applied to rows read in joining date order.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Filter values have to be selective, as in production, for an index
+        # lookup to beat reading the joining date index and filtering.
+        departments = Department.objects.bulk_create(
+            Department(name=f'Department {i}', location='Pune') for i in range(20)
+        )
+        positions = Position.objects.bulk_create(Position(title=f'Position {i}') for i in range(10))
+        cls.department = departments[0]
+        cls.position = positions[0]
+        Employee.objects.bulk_create(
+            Employee(
+                first_name=f'First{i}', last_name=f'Last{i}', email=f'employee{i}@example.com',
+                phone_number='9000000000', date_of_birth=datetime.date(1990, 1, 1),
+                date_of_joining=datetime.date(2010, 1, 1) + datetime.timedelta(days=i % 4000),
+                salary=50000 + i,
+                department=departments[i % len(departments)],
+                position=positions[(i // 3) % len(positions)],
+            )
+            for i in range(10000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Employee._meta.db_table}')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('SET LOCAL enable_incremental_sort = off')
+
+    def query_params(self, params):
+        query_params = QueryDict(mutable=True)
+        for key, value in params.items():
+            value = value.replace('DEPARTMENT', str(self.department.pk)).replace('POSITION', str(self.position.pk))
+            query_params[key] = value
+        return query_params
+
+    def request(self, params):
+        return Request(APIRequestFactory().get('/apiV1/employee-list/', self.query_params(params)))
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(plan_nodes(plan[0]['Plan']))
+
+    def assertIndexed(self, sql, params, filters):
+        nodes = self.plan(sql, params)
+        unindexed = UNINDEXED_NODES.intersection(node['Node Type'] for node in nodes)
+        self.assertFalse(unindexed, f'{", ".join(sorted(unindexed))} for filters {filters}: {sql}')
+
+        # Partitioned installs scan employees_y<year> partitions.
+        scans = [node for node in nodes if node.get('Relation Name', '').startswith(Employee._meta.db_table)]
+        for param, column in FILTER_COLUMNS.items():
+            if param not in filters:
+                continue
+            for scan in scans:
+                self.assertIn(
+                    column, scan.get('Index Cond', ''),
+                    f'{column} is filtered, not looked up, in {scan["Node Type"]} on {scan["Relation Name"]} '
+                    f'for filters {filters}: {sql}'
+                )
+
+    def test_list_pages(self):
+        for filters in FILTER_COMBINATIONS:
+            with self.subTest(filters=filters):
+                queryset = filter_employees(employee_values(list(LIST_FIELDS)), self.query_params(filters))
+                queryset = queryset.order_by('-date_of_joining')[40:61]
+                self.assertIndexed(*queryset.query.sql_with_params(), filters)
+
+    def test_list_cursor_pages(self):
+        first_page = {'pagination': 'cursor'}
+        after = {'cursor': EmployeeCursorPagination().encode_cursor(
+            {'date_of_joining': datetime.date(2016, 6, 1), 'id': 10 ** 9}, reverse=False
+        )}
+        before = {'cursor': EmployeeCursorPagination().encode_cursor(
+            {'date_of_joining': datetime.date(2016, 6, 1), 'id': 0}, reverse=True
+        )}
+        for filters in FILTER_COMBINATIONS:
+            for page in (first_page, after, before):
+                params = {**filters, **page}
+                with self.subTest(params=params):
+                    queryset = filter_employees(employee_values(list(LIST_FIELDS)), self.query_params(params))
+                    queryset = EmployeeCursorPagination().page_queryset(queryset, self.request(params))
+                    self.assertIndexed(*queryset.query.sql_with_params(), params)
+
+    def test_exports(self):
+        for filters in FILTER_COMBINATIONS:
+            with self.subTest(filters=filters):
+                queryset = EmployeeExportAPIViewV3().get_queryset(self.request(filters))
+                self.assertIndexed(*export_copy_sql(queryset), filters)
+
+    def test_list_view_queries(self):
+        # The queries the view itself runs, with whatever fields it selects.
+        for filters in FILTER_COMBINATIONS:
+            for page in ({'page': '2'}, {'pagination': 'cursor'}):
+                params = {**filters, **page}
+                with self.subTest(params=params), CaptureQueriesContext(connection) as queries:
+                    EmployeeListAPIView().render_page(self.request(params), list(LIST_FIELDS))
+                    page_queries = [query['sql'] for query in queries if 'ORDER BY' in query['sql']]
+                    self.assertEqual(len(page_queries), 1)
+                    self.assertIndexed(page_queries[0], None, filters)
+
+    def test_async_exports(self):
+        for filters in FILTER_COMBINATIONS:
+            with self.subTest(filters=filters):
+                queryset = filter_employees(Employee.objects.all(), self.query_params(filters))
+                queryset = export_values(queryset.order_by('-date_of_joining'))
+                self.assertIndexed(*queryset.query.sql_with_params(), filters)
+
+    def test_search_uses_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT indexname FROM pg_indexes WHERE tablename LIKE %s AND indexdef LIKE %s',
+                [f'{Employee._meta.db_table}%', '%gin_trgm_ops%']
+            )
+            trigram_indexes = {row[0] for row in cursor.fetchall()}
+            if not trigram_indexes:
+                self.skipTest('pg_trgm is not installed')
+            # A search matches few enough rows to sort them.
+            cursor.execute('SET LOCAL enable_sort = on')
+
+        queryset = filter_employees(employee_values(list(LIST_FIELDS)), self.query_params({'search': 'first1234'}))
+        nodes = self.plan(*queryset.order_by('-date_of_joining')[:20].query.sql_with_params())
+        lookups = [node for node in nodes if node['Node Type'] == 'Bitmap Index Scan']
+        self.assertTrue(lookups, f'No bitmap index scans in {nodes}')
+        self.assertLessEqual({node['Index Name'] for node in lookups}, trigram_indexes)
+        conditions = ' '.join(node['Index Cond'] for node in lookups)
+        for column in ('first_name', 'last_name', 'email'):
+            self.assertIn(f'upper(({column})::text)', conditions)
+
+    def test_delta_exports(self):
+        filters = {'updated_since': '2020-01-01T00:00:00Z'}
+        request = self.request(filters)
+        queryset = EmployeeExportAPIViewV3().get_queryset(request)
+        queryset = apply_delta(queryset, delta_since(request.query_params), delta_until())
+        self.assertIndexed(*export_copy_sql(queryset), filters)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        engineering = Department.objects.create(name='Engineering', location='Pune')
+        sales = Department.objects.create(name='Sales', location='Pune')
+        position = Position.objects.create(title='Position')
+        people = [
+            ('Alice', 'Smith', 'alice@example.com', sales),
+            ('Bob', 'Jones', 'bob@example.com', sales),
+            ('Carol', 'White', 'carol@contractors.test', sales),
+            ('Dave', 'Brown', 'dave@example.com', engineering),
+        ]
+        cls.ids = {}
+        for first_name, last_name, email, department in people:
+            cls.ids[first_name] = Employee.objects.create(
+                first_name=first_name, last_name=last_name, email=email, phone_number='9000000000',
+                date_of_birth=datetime.date(1990, 1, 1), date_of_joining=datetime.date(2020, 1, 1),
+                salary=50000, department=department, position=position,
+            ).pk
+
+    def search(self, term):
+        query_params = QueryDict(mutable=True)
+        query_params['search'] = term
+        return set(filter_employees(Employee.objects.all(), query_params).values_list('pk', flat=True))
+
+    def test_matches_any_field_ignoring_case(self):
+        for term, first_name in [
+            ('LIC', 'Alice'), ('jones', 'Bob'), ('contractors.test', 'Carol'), ('engineer', 'Dave'),
+        ]:
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), {self.ids[first_name]})
+
+    def test_matches_across_fields(self):
+        self.assertEqual(self.search('on'), {self.ids['Bob'], self.ids['Carol']})
+        self.assertEqual(self.search('nobody'), set())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EmployeeStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        departments = Department.objects.bulk_create(
+            Department(name=f'Department {i}', location='Pune') for i in range(2)
+        )
+        positions = Position.objects.bulk_create(Position(title=f'Position {i}') for i in range(2))
+        cls.department, cls.position = departments[0], positions[0]
+        Employee.objects.bulk_create(
+            Employee(
+                first_name=f'First{i}', last_name=f'Last{i}', email=f'stats{i}@example.com',
+                phone_number='9000000000', date_of_birth=datetime.date(1990, 1, 1),
+                date_of_joining=datetime.date(2020, 1, 1), salary=1000 * (i + 1),
+                department=departments[i % 2], position=positions[i // 2],
+            )
+            for i in range(4)
+        )
+        refresh_employee_stats()
+
+    def totals(self, params):
+        response = Client().get('/apiV1/employee-stats/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['totals']
+
+    def test_totals_follow_filters(self):
+        self.assertEqual(self.totals({})['headcount'], 4)
+        self.assertEqual(self.totals({'department': self.department.pk})['salary_total'], 1000 + 3000)
+        self.assertEqual(self.totals({'position': self.position.pk})['salary_total'], 1000 + 2000)
+        self.assertEqual(
+            self.totals({'department': self.department.pk, 'position': self.position.pk}),
+            {'headcount': 1, 'salary_total': 1000, 'salary_avg': 1000},
+        )
+
+    def test_invalid_filters(self):
+        for params in ({'department': 'abc'}, {'position': '1.5'}, {'start_date': '2024-13-01'},
+                       {'end_date': 'yesterday'}):
+            with self.subTest(params=params):
+                response = Client().get('/apiV1/employee-stats/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DimensionCacheTests(TestCase):
+
+    def test_names_follow_regenerated_data(self):
+        Department.objects.create(name='Old department', location='Pune')
+        Position.objects.create(title='Old position')
+        departments.names()
+        positions.names()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'generate_employees', truncate=True, employees=20, departments=3, positions=2,
+                batch_size=20, stdout=io.StringIO()
+            )
+
+        expected = dict(Department.objects.values_list('id', 'name'))
+        self.assertEqual(departments.names(), expected)
+        self.assertEqual(positions.names(), dict(Position.objects.values_list('id', 'title')))
+        self.assertNotIn('Old department', departments.ids())
+
+        frame = pd.DataFrame({'department': ['Department 0001'], 'position': ['Position 0000']})
+        chunk = {}
+        resolved = resolve_names(frame, chunk)
+        self.assertEqual(resolved['department_id'][0], Department.objects.get(name='Department 0001').pk)
+        self.assertEqual(resolved['position_id'][0], Position.objects.get(title='Position 0000').pk)
+        self.assertEqual(chunk, {'new_departments': [], 'new_positions': []})
+
+        rows = EmployeeListAPIView().render_page(self.request_for({'page_size': '20'}), ['id', 'department_name'])
+        for row in orjson.loads(rows)['results']:
+            self.assertEqual(row['department_name'], Employee.objects.get(pk=row['id']).department.name)
+
+    def request_for(self, params):
+        query_params = QueryDict(mutable=True)
+        query_params.update(params)
+        return Request(APIRequestFactory().get('/apiV1/employee-list/', query_params))
+
+
+@override_settings(EXPORT_WATERMARK_LAG=60, IMPORT_JOB_STALE_AFTER=600)
+class DeltaWindowTests(TestCase):
+
+    def running_job(self, started_ago, heartbeat_ago):
+        now = timezone.now()
+        job = ImportJob.objects.create(file_name='employees.csv', status=ImportJob.STATUS_RUNNING)
+        ImportJob.objects.filter(pk=job.pk).update(
+            started_at=now - datetime.timedelta(seconds=started_ago),
+            updated_at=now - datetime.timedelta(seconds=heartbeat_ago),
+        )
+        return ImportJob.objects.get(pk=job.pk)
+
+    def assertLagging(self, until, seconds):
+        expected = timezone.now() - datetime.timedelta(seconds=seconds)
+        self.assertAlmostEqual(until.timestamp(), expected.timestamp(), delta=5)
+
+    def test_bound_lags_the_clock(self):
+        self.assertLagging(delta_until(), 60)
+
+    def test_running_import_holds_the_bound(self):
+        job = self.running_job(started_ago=3600, heartbeat_ago=10)
+        self.assertEqual(delta_until(), job.started_at)
+
+    def test_orphaned_import_does_not_hold_the_bound(self):
+        self.running_job(started_ago=7 * 24 * 3600, heartbeat_ago=6 * 24 * 3600)
+        self.assertLagging(delta_until(), 60)
+
+    def test_watermark_round_trip(self):
+        until = delta_until()
+        request = QueryDict(mutable=True)
+        request['watermark'] = watermark_token(until)
+        self.assertEqual(delta_since(request), until)
+        request['watermark'] = 'tampered'
+        with self.assertRaises(ValidationError):
+            delta_since(request)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMPORT_CHUNK_SIZE=128)
+class ImportMergeTests(TransactionTestCase):
+    """Imports whose duplicate emails land in different chunks."""
+
+    HEADER = 'first_name,last_name,email,phone_number,date_of_birth,date_of_joining,salary,department,position\n'
+
+    def stage(self, mode):
+        rows = [f'Filler,{i},filler{i}@example.com,900,1990-01-01,2020-01-01,100,D,P' for i in range(6)]
+        rows = ['First,Row,dup@example.com,900,1990-01-01,2020-01-01,100,D,P'] + rows
+        rows += ['Last,Row,dup@example.com,900,1990-01-01,2020-01-01,100,D,P']
+        loader = StagingLoader(uuid.uuid4())
+        loader.feed((self.HEADER + '\n'.join(rows) + '\n').encode())
+        loader.finish()
+        self.assertIsNone(loader.error)
+        self.assertGreater(len(loader.chunks), 2)
+        return ImportJob.objects.create(
+            id=loader.job_id, file_name='employees.csv', mode=mode,
+            rows_total=loader.rows, chunks=loader.chunks,
+        )
+
+    def staged_first_names(self, job, email):
+        tables = ' UNION ALL '.join(
+            f'SELECT first_name FROM {staging_table_name(job.pk, chunk["index"])} WHERE email = %s'
+            for chunk in job.chunks
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(tables, [email] * len(job.chunks))
+            return [row[0] for row in cursor.fetchall()]
+
+    def assertImportKeeps(self, mode, first_name):
+        job = self.stage(mode)
+        self.assertEqual(sorted(self.staged_first_names(job, 'dup@example.com')), ['First', 'Last'])
+        drop_superseded_rows(job, job.chunks)
+        self.assertEqual(self.staged_first_names(job, 'dup@example.com'), [first_name])
+
+        run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(job.employees_created, 7)
+        self.assertEqual(Employee.objects.get(email='dup@example.com').first_name, first_name)
+
+    def test_upsert_keeps_last_row(self):
+        self.assertImportKeeps(ImportJob.MODE_UPSERT, 'Last')
+
+    def test_insert_keeps_first_row(self):
+        self.assertImportKeeps(ImportJob.MODE_INSERT, 'First')
+
+
+CSV_HEADER = 'first_name,last_name,email,phone_number,date_of_birth,date_of_joining,salary,department,position'
+
+REJECTED_ROWS = {
+    3: ('Bad,Date,bad-date@example.com,900,1990-13-01,2024-01-01,100,D,P',
+        'date_of_birth is not a YYYY-MM-DD date'),
+    4: ('Big,Salary,big@example.com,900,1990-01-01,2024-01-01,123456789.00,D,P',
+        'salary must be below 100000000'),
+    5: ('Long,Phone,long@example.com,12345678901234567,1990-01-01,2024-01-01,1,D,P',
+        'phone_number is longer than 15 characters'),
+    6: ('Bad,Email,not-an-email,900,1990-01-01,2024-01-01,1,D,P',
+        'email is not a valid address'),
+    7: ('Too,Few,fields',
+        'expected 9 fields, found 3'),
+    8: ('No,Department,no-department@example.com,900,1990-01-01,2024-01-01,abc,,P',
+        'department is required; salary is not a number'),
+}
+
+ACCEPTED_ROWS = {
+    2: 'Good,One,good@example.com,900,1990-01-01,2024-01-01,100.50,D,P',
+    9: 'Old,Date,old@example.com,900,1500-06-01,9999-12-31,-5,D,P',
+    10: '"Multi\nLine",Quote,multi@example.com,  900 ,1990-01-01,2024-01-01,1,D,P',
+}
+
+
+def upload_text():
+    rows = {**{line: row for line, (row, _) in REJECTED_ROWS.items()}, **ACCEPTED_ROWS}
+    return CSV_HEADER + '\n' + '\n'.join(rows[line] for line in sorted(rows)) + '\n'
+
+
+class RowValidationTests(TestCase):
+
+    def test_row_errors(self):
+        frame, malformed = parse_chunk(upload_text().split('\n', 1)[1].encode(), 2, CSV_HEADER.split(','))
+        self.assertEqual(malformed, [(7, 'expected 9 fields, found 3', ['Too', 'Few', 'fields'])])
+
+        errors = row_errors(frame)
+        expected = {line: error for line, (_, error) in REJECTED_ROWS.items() if line != 7}
+        self.assertEqual(errors[errors != ''].to_dict(), expected)
+        self.assertEqual(sorted(errors.index[errors == '']), sorted(ACCEPTED_ROWS))
+        self.assertEqual(frame.loc[10, 'first_name'], 'Multi\nLine')
+        self.assertEqual(frame.loc[10, 'phone_number'], '900')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMPORT_CHUNK_SIZE=256)
+class ImportRejectsTests(TransactionTestCase):
+
+    def setUp(self):
+        self.rejects_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(IMPORT_REJECTS_ROOT=self.rejects_root))
+
+    def test_rejects_file(self):
+        loader = StagingLoader(uuid.uuid4())
+        loader.feed(upload_text().encode())
+        loader.finish()
+        self.addCleanup(drop_staging_tables, loader.job_id, loader.chunks)
+
+        self.assertIsNone(loader.error)
+        self.assertGreater(len(loader.chunks), 1)
+        self.assertEqual((loader.rows, loader.rows_rejected), (len(ACCEPTED_ROWS), len(REJECTED_ROWS)))
+        self.assertEqual(os.listdir(self.rejects_root), [os.path.basename(rejects_path(loader.job_id))])
+
+        with open(loader.rejects, newline='', encoding='utf-8') as f:
+            rejects = list(csv.reader(f))
+        self.assertEqual(rejects[0], ['line', 'errors', *CSV_HEADER.split(',')])
+        self.assertEqual(rejects[1:], [
+            [str(line), error, *next(csv.reader([row]))]
+            for line, (row, error) in sorted(REJECTED_ROWS.items())
+        ])
+
+    def test_stray_quote_does_not_hold_back_the_upload(self):
+        good = ACCEPTED_ROWS[2]
+        rows = [good.replace('good@', f'good{i}@') for i in range(40)]
+        rows[1] = rows[1].replace('Good', '"Stray', 1)
+        loader = StagingLoader(uuid.uuid4())
+        for row in [CSV_HEADER, *rows]:
+            loader.feed((row + '\n').encode())
+            self.assertLess(len(loader.buffer), 2 * 256 + len(row) + 1)
+        self.assertGreater(len(loader.chunks), 1)
+        loader.finish()
+        self.addCleanup(drop_staging_tables, loader.job_id, loader.chunks)
+
+        self.assertIsNone(loader.error)
+        self.assertEqual(loader.rows_rejected, 1)
+        self.assertGreater(loader.rows, 1)
+        with open(loader.rejects, newline='', encoding='utf-8') as f:
+            self.assertEqual(list(csv.reader(f))[1][0], '3')
+
+    def test_invalid_mode_discards_rejects(self):
+        upload = SimpleUploadedFile('employees.csv', upload_text().encode(), 'text/csv')
+        response = Client().post('/apiV1/upload-csv/', {'file': upload, 'mode': 'replace'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(self.rejects_root), [])
+        self.assertFalse(ImportJob.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheBuildTests(SimpleTestCase):
+    """Single-flight builds and stale-while-revalidate in ``cache_get_or_build``."""
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+        self.release = threading.Event()
+
+    def build(self, value='built'):
+        self.builds += 1
+        self.release.wait(5)
+        return value
+
+    async def abuild(self, value='built'):
+        self.builds += 1
+        await asyncio.sleep(0.2)
+        return value
+
+    def store_stale(self, key, value):
+        cache.set(key, CachedEntry(time.time() - 1, value), 60)
+
+    def wait_for_value(self, key, value):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            entry = lookup_entry(key)
+            if entry is not None and entry.value == value and cache.get(f'{key}:lock') is None:
+                return
+            time.sleep(0.01)
+        self.fail(f'{key} was not refreshed to {value!r}')
+
+    def test_concurrent_misses_build_once(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(cache_get_or_build, 'single-flight', self.build, 60) for _ in range(4)]
+            time.sleep(0.2)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['built'] * 4)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(cache_get_or_build('single-flight', self.build, 60), 'built')
+        self.assertEqual(self.builds, 1)
+
+    def test_stale_value_is_served_while_rebuilt(self):
+        self.store_stale('stale', 'old')
+
+        self.assertEqual(cache_get_or_build('stale', lambda: self.build('new'), 60), 'old')
+        # The refresh holds the lock, so a second stale read starts no other.
+        self.assertEqual(cache_get_or_build('stale', lambda: self.build('new'), 60), 'old')
+        self.release.set()
+
+        self.wait_for_value('stale', 'new')
+        self.assertEqual(cache_get_or_build('stale', lambda: self.build('newer'), 60), 'new')
+        self.assertEqual(self.builds, 1)
+
+    def test_async_concurrent_misses_build_once(self):
+        async def requests():
+            return await asyncio.gather(*(acache_get_or_build('async-single-flight', self.abuild, 60) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(requests()), ['built'] * 4)
+        self.assertEqual(self.builds, 1)
+
+    def test_async_stale_value_is_served_while_rebuilt(self):
+        self.store_stale('async-stale', 'old')
+
+        async def requests():
+            first = await acache_get_or_build('async-stale', lambda: self.abuild('new'), 60)
+            second = await acache_get_or_build('async-stale', lambda: self.abuild('new'), 60)
+            await asyncio.sleep(0.5)
+            return first, second, await acache_get_or_build('async-stale', lambda: self.abuild('newer'), 60)
+
+        self.assertEqual(asyncio.run(requests()), ('old', 'old', 'new'))
+        self.assertEqual(self.builds, 1)
+
+    def test_data_version_changes_keys(self):
+        params = QueryDict('position=2&department=1&search=')
+        key = build_cache_key('employee_list', params)
+        self.assertEqual(key, build_cache_key('employee_list', QueryDict('department=1&position=2')))
+        self.assertEqual(cache_get_or_build(key, lambda: 'before', 60), 'before')
+
+        bump_data_version()
+        new_key = build_cache_key('employee_list', params)
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(cache_get_or_build(new_key, lambda: 'after', 60), 'after')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CursorPaginationTests(TestCase):
+    """Walking the cursor pages of employees, many of them joining on the same day."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Department', location='Pune')
+        position = Position.objects.create(title='Position')
+        Employee.objects.bulk_create(
+            Employee(
+                first_name=f'First{i}', last_name=f'Last{i}', email=f'cursor{i}@example.com',
+                phone_number='9000000000', date_of_birth=datetime.date(1990, 1, 1),
+                # Runs of four on one day, so pages start and end inside a run.
+                date_of_joining=datetime.date(2020, 1, 1) + datetime.timedelta(days=i // 4),
+                salary=50000, department=department, position=position,
+            )
+            for i in range(11)
+        )
+        cls.ordered = list(Employee.objects.order_by('-date_of_joining', '-id').values_list('id', flat=True))
+
+    def page(self, cursor=None):
+        params = {'page_size': '3'}
+        if cursor:
+            params['cursor'] = cursor
+        paginator = EmployeeCursorPagination()
+        request = Request(APIRequestFactory().get('/apiV1/employee-list/', params))
+        rows = paginator.paginate_queryset(Employee.objects.values('id', 'date_of_joining'), request)
+        return [row['id'] for row in rows], paginator.get_next_cursor(), paginator.get_previous_cursor()
+
+    def test_pages_forward_and_back(self):
+        pages = []
+        ids, next_cursor, previous_cursor = self.page()
+        self.assertIsNone(previous_cursor)
+        pages.append(ids)
+        while next_cursor:
+            ids, next_cursor, previous_cursor = self.page(next_cursor)
+            self.assertIsNotNone(previous_cursor)
+            pages.append(ids)
+
+        self.assertEqual([pk for ids in pages for pk in ids], self.ordered)
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 3, 2])
+
+        back = []
+        while previous_cursor:
+            ids, next_cursor, previous_cursor = self.page(previous_cursor)
+            self.assertIsNotNone(next_cursor)
+            back.insert(0, ids)
+        self.assertEqual(back, pages[:-1])
+
+    def test_invalid_cursors(self):
+        cursors = [
+            'not-base64!',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            base64.urlsafe_b64encode(b'{"d": "2020-01-01"}').decode(),
+            base64.urlsafe_b64encode(b'{"d": "2020-13-01", "i": 1}').decode(),
+            base64.urlsafe_b64encode(b'{"d": "2020-01-01", "i": "one"}').decode(),
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.page(cursor)
+
+
+class ArtifactResponseTests(SimpleTestCase):
+    """Conditional and range requests for a stored export."""
+
+    CONTENT = b'id,name\n' + b''.join(b'%d,Employee %d\n' % (i, i) for i in range(100))
+
+    def setUp(self):
+        root = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = os.path.join(root, 'export_csv-1-digest.csv')
+        with open(self.path, 'wb') as f:
+            f.write(self.CONTENT)
+        self.etag = self.respond()['ETag']
+
+    def respond(self, asynchronous=False, **headers):
+        request = RequestFactory().get('/apiV1/export-csv/', headers=headers)
+        response = artifact_response(request, self.path, 'employees.csv', asynchronous=asynchronous)
+        if response is not None:
+            self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        if response.is_async:
+            async def read():
+                return b''.join([chunk async for chunk in response.streaming_content])
+            return asyncio.run(read())
+        return b''.join(response.streaming_content)
+
+    def test_full_response(self):
+        response = self.respond()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_missing_artifact(self):
+        os.remove(self.path)
+        self.assertIsNone(self.respond())
+
+    def test_not_modified(self):
+        base = self.etag.strip('"')
+        for header in (self.etag, f'W/{self.etag}', f'"other", {self.etag}', f'"{base}-gzip"', '*'):
+            with self.subTest(if_none_match=header):
+                response = self.respond(if_none_match=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(self.respond(if_none_match='"other"').status_code, 200)
+
+    def test_ranges(self):
+        size = len(self.CONTENT)
+        ranges = {
+            'bytes=0-9': (0, 9),
+            'bytes=10-': (10, size - 1),
+            'bytes=-5': (size - 5, size - 1),
+            'bytes=-100000': (0, size - 1),
+            f'bytes=20-{size + 50}': (20, size - 1),
+        }
+        for header, (start, end) in ranges.items():
+            for asynchronous in (False, True):
+                with self.subTest(range=header, asynchronous=asynchronous):
+                    response = self.respond(asynchronous, range=header)
+                    self.assertEqual(response.status_code, 206)
+                    self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                    self.assertEqual(response['Content-Length'], str(end - start + 1))
+                    self.assertEqual(self.body(response), self.CONTENT[start:end + 1])
+
+    def test_unsatisfiable_ranges(self):
+        for header in (f'bytes={len(self.CONTENT)}-', 'bytes=-0'):
+            with self.subTest(range=header):
+                response = self.respond(range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=0-1,5-6', 'bytes=9-3', 'bytes=-', 'items=0-9'):
+            with self.subTest(range=header):
+                response = self.respond(range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_if_range(self):
+        response = self.respond(range='bytes=0-9', if_range=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.CONTENT[:10])
+
+        # A client holding an older copy gets the whole new one.
+        response = self.respond(range='bytes=0-9', if_range='"older"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_async_store(self):
+        path = os.path.join(os.path.dirname(self.path), 'export_csv-2-digest.csv')
+
+        async def chunks():
+            for i in range(3):
+                yield b'%d\n' % i
+
+        async def stream():
+            return b''.join([chunk async for chunk in atee_to_artifact(chunks(), path)])
+
+        async def abort():
+            tee = atee_to_artifact(chunks(), path)
+            await tee.__anext__()
+            await tee.aclose()
+
+        asyncio.run(abort())
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [os.path.basename(self.path)])
+
+        self.assertEqual(asyncio.run(stream()), b'0\n1\n2\n')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'0\n1\n2\n')
+
+    def test_unsupported_compression_closes_file(self):
+        response = self.respond()
+        request = Request(RequestFactory().get('/apiV1/export-csv/', {'compression': 'brotli'}))
+        with self.assertRaises(ValidationError):
+            compress_response(request, response)
+        self.assertTrue(response.file_to_stream.closed)
+
+
+class RowCountTests(SimpleTestCase):
+    """Rows counted in a streamed CSV body, whatever its chunking."""
+
+    BODY = (
+        b'id,first_name,notes\n'
+        b'1,Ann,plain\n'
+        b'2,"Multi\nLine","say ""hi""\nagain"\n'
+        b'3,"Comma, Quoted",""\n'
+        b'4,Dan,"ends with newline\n"\n'
+    )
+
+    def chunked(self, size):
+        return [self.BODY[i:i + size] for i in range(0, len(self.BODY), size)]
+
+    def test_quoted_newlines_are_not_rows(self):
+        for size in (1, 2, 7, len(self.BODY)):
+            with self.subTest(chunk_size=size):
+                metrics = RequestMetrics()
+                self.assertEqual(b''.join(count_rows(self.chunked(size), metrics)), self.BODY)
+                self.assertEqual(metrics.rows_streamed, 4)
+
+        metrics = RequestMetrics()
+        list(count_rows([self.BODY.decode()], metrics, header_rows=0))
+        self.assertEqual(metrics.rows_streamed, 5)
+
+    def test_async_body(self):
+        async def chunks():
+            for chunk in self.chunked(3):
+                yield chunk
+
+        async def consume(metrics):
+            return [chunk async for chunk in acount_rows(chunks(), metrics)]
+
+        metrics = RequestMetrics()
+        asyncio.run(consume(metrics))
+        self.assertEqual(metrics.rows_streamed, 4)
@@ -0,0 +1,55 @@
+import uuid
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+from master_config.importer import StagingLoader
+
+
+class StagedCsvUpload:
+    def __init__(self, name, size, loader):
+        self.name = name
+        self.size = size
+        self.job_id = loader.job_id
+        self.rows = loader.rows
+        self.rows_rejected = loader.rows_rejected
+        self.chunk_results = loader.chunks
+        self.error = loader.error
+
+
+class CsvCopyUploadHandler(FileUploadHandler):
+    """
+    Upload handler that streams the ``file`` field straight into a COPY
+    instead of buffering it in memory or in a temporary file.
+    """
+
+    chunk_size = 1024 * 1024
+    upload_field = 'file'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.loader = None
+        self.active = False
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name == self.upload_field and self.loader is None
+        if self.active:
+            self.loader = StagingLoader(uuid.uuid4())
+            if not file_name.endswith('.csv'):
+                self.loader.error = 'File must be a CSV'
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.active:
+            self.loader.feed(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        self.loader.finish()
+        return StagedCsvUpload(self.file_name, file_size, self.loader)
+
+    def upload_interrupted(self):
+        if self.loader is not None:
+            self.loader.abort()
@@ -1,12 +1,22 @@
 from django.urls import path
 from master_config.export_csv_v2 import EmployeeExportAPIViewV2
-from master_config.views import EmployeeListAPIView
-from master_config.upload_csv import EmployeeCsvUploadView
+from master_config.export_csv_v3 import EmployeeExportAPIViewV3
+from master_config.views import EmployeeListAPIView, EmployeeStatsAPIView
+from master_config.upload_csv import EmployeeCsvUploadView, ImportJobDetailView, ImportJobRejectsView
+from master_config.async_views import AsyncEmployeeExportView, AsyncEmployeeListView
 from master_config.export_csv import EmployeeExportAPIView
+from master_config.metrics import metrics_view
 
 urlpatterns = [
     path('employee-list/', EmployeeListAPIView.as_view()),
+    path('employee-list-async/', AsyncEmployeeListView.as_view()),
+    path('employee-stats/', EmployeeStatsAPIView.as_view()),
     path('upload-csv/', EmployeeCsvUploadView.as_view()),
+    path('import-jobs/<uuid:job_id>/', ImportJobDetailView.as_view(), name='import-job-detail'),
+    path('import-jobs/<uuid:job_id>/rejects/', ImportJobRejectsView.as_view(), name='import-job-rejects'),
     path('export-csv/', EmployeeExportAPIView.as_view()),
     path('export-csv-v2/', EmployeeExportAPIViewV2.as_view()),
+    path('export-csv-v3/', EmployeeExportAPIViewV3.as_view()),
+    path('export-csv-async/', AsyncEmployeeExportView.as_view()),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
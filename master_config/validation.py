@@ -0,0 +1,137 @@
+import csv
+import datetime
+import io
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+# Limits of the staging and employees columns, so rows that would make
+# COPY or the merge fail are caught up front.
+TEXT_LIMITS = {
+    'first_name': 100,
+    'last_name': 100,
+    'email': 254,
+    'phone_number': 15,
+    'department': 100,
+    'position': 100,
+}
+DATE_COLUMNS = ('date_of_birth', 'date_of_joining')
+DATE_PATTERN = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+EMAIL_PATTERN = r'^[^@\s,;<>]+@[^@\s,;<>]+\.[^@\s,;<>]+$'
+# NUMERIC(10,2)
+SALARY_LIMIT = 10 ** 8
+
+REJECTS_SUFFIX = '.csv'
+PART_SUFFIX = '.part'
+
+
+def rejects_path(job_id):
+    return os.path.join(settings.IMPORT_REJECTS_ROOT, f'{job_id}{REJECTS_SUFFIX}')
+
+
+def chunk_rejects_path(job_id, chunk_index):
+    return os.path.join(settings.IMPORT_REJECTS_ROOT, f'{job_id}-{chunk_index}{PART_SUFFIX}')
+
+
+def rejects_job_id(name):
+    """Import job a rejects file or part belongs to, or ``None`` for foreign files."""
+    if name.endswith(REJECTS_SUFFIX):
+        stem = name[:-len(REJECTS_SUFFIX)]
+    elif name.endswith(PART_SUFFIX):
+        stem = name[:-len(PART_SUFFIX)].rpartition('-')[0]
+    else:
+        return None
+    try:
+        return uuid.UUID(stem)
+    except ValueError:
+        return None
+
+
+def parse_chunk(data, first_line, headers):
+    """
+    Splits a chunk into a frame of well-formed records and a list of
+    ``(line, error, fields)`` for the malformed ones. Each record is
+    numbered with the file line it starts on.
+    """
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    records, lines, malformed = [], [], []
+    line = first_line
+    for fields in reader:
+        if fields and len(fields) == len(headers):
+            records.append(fields)
+            lines.append(line)
+        elif fields:
+            malformed.append((line, f'expected {len(headers)} fields, found {len(fields)}', fields))
+        line = first_line + reader.line_num
+
+    frame = pd.DataFrame(records, columns=headers, dtype=object)
+    frame.index = pd.Index(lines, name='line')
+    return frame.apply(lambda column: column.map(str.strip)), malformed
+
+
+def is_date(value):
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def valid_dates(values):
+    """
+    Mask of ``YYYY-MM-DD`` calendar dates. pandas parses the bulk; the few
+    it can't, such as years outside its nanosecond range that a DATE
+    column stores fine, are checked one by one.
+    """
+    shaped = values.str.match(DATE_PATTERN).to_numpy(dtype=bool)
+    valid = shaped & pd.to_datetime(values, format='%Y-%m-%d', errors='coerce').notna().to_numpy()
+    recheck = shaped & ~valid
+    valid[recheck] = [is_date(value) for value in values[recheck]]
+    return valid
+
+
+def row_errors(frame):
+    """
+    ``'; '``-separated problems for every row of ``frame``, or ``''`` for
+    rows that can be loaded. Every check runs on whole columns at once;
+    messages are only put together for the rows that fail one.
+    """
+    checks = {}
+
+    present = {column: (frame[column] != '').to_numpy() for column in frame.columns}
+    for column in frame.columns:
+        checks[f'{column} is required'] = ~present[column]
+
+    for column, limit in TEXT_LIMITS.items():
+        lengths = np.char.str_len(frame[column].to_numpy(dtype=str))
+        checks[f'{column} is longer than {limit} characters'] = lengths > limit
+
+    checks['email is not a valid address'] = present['email'] & ~frame['email'].str.match(EMAIL_PATTERN).to_numpy()
+
+    for column in DATE_COLUMNS:
+        checks[f'{column} is not a YYYY-MM-DD date'] = present[column] & ~valid_dates(frame[column])
+
+    salary = pd.to_numeric(frame['salary'], errors='coerce').to_numpy(dtype=float)
+    with np.errstate(invalid='ignore'):
+        checks['salary is not a number'] = present['salary'] & ~np.isfinite(salary)
+        checks[f'salary must be below {SALARY_LIMIT}'] = np.abs(np.round(salary, 2)) >= SALARY_LIMIT
+
+    messages = np.array(list(checks), dtype=object)
+    failed = np.column_stack(list(checks.values())) if len(frame) else np.zeros((0, len(checks)), dtype=bool)
+    errors = pd.Series('', index=frame.index, dtype=object)
+    rejected = failed.any(axis=1)
+    errors[rejected] = ['; '.join(messages[row]) for row in failed[rejected]]
+    return errors
+
+
+def write_rejects(path, rejected):
+    """Appends ``(line, errors, fields)`` rows to the rejects file at ``path``."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for line, errors, fields in rejected:
+            writer.writerow([line, errors, *fields])
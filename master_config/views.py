@@ -1,18 +1,124 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, F
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_date
 from django.core.cache import cache
 from django.conf import settings
-from .models import Department, Employee, Position
+from django.http import HttpResponse
+from .caching import build_cache_key, cache_get, cache_get_or_build
+from .counting import CountedPaginator, count_employees
+from .dimensions import departments, positions
+from .filters import filter_employees
+from .models import Department, DepartmentStats, Employee, MonthlyJoiningStats, Position, PositionStats
+from .renderers import ORJSONRenderer, render_json
+import base64
+import json
+import orjson
+from functools import partial
+
+
+# Columns of the employee list, in response order. ``fields=`` picks a subset.
+LIST_FIELDS = {
+    'id': 'id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'date_of_joining': 'date_of_joining',
+    'phone_number': 'phone_number',
+    'salary': 'salary',
+    'department_name': 'department_id',
+    'position_title': 'position_id',
+}
+
+# Fields rendered from an id through the in-process name lookups rather
+# than a join.
+NAMED_FIELDS = {
+    'department_name': ('department_id', departments),
+    'position_title': ('position_id', positions),
+}
+
+# Always selected: cursor pagination builds its cursors from them.
+CURSOR_FIELDS = ('id', 'date_of_joining')
+
+
+def list_fields(query_params):
+    value = query_params.get('fields')
+    if not value:
+        return list(LIST_FIELDS)
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = sorted(requested - set(LIST_FIELDS))
+    if unknown:
+        raise ValidationError({
+            'fields': f'Unknown field(s): {", ".join(unknown)}. Expected any of: {", ".join(LIST_FIELDS)}'
+        })
+    return [field for field in LIST_FIELDS if field in requested]
+
+
+def id_param(query_params, name):
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Expected a numeric id.'})
+
+
+def date_param(query_params, name):
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected a YYYY-MM-DD date.'})
+    return parsed
+
+
+def employee_values(fields):
+    """``values()`` queryset for ``fields``; names are filled in by ``only_fields``."""
+    columns = [field for field in LIST_FIELDS if field in fields or field in CURSOR_FIELDS]
+    return Employee.objects.values(*(LIST_FIELDS[field] for field in columns))
+
+
+def field_names(fields):
+    """id -> name lookups for the named fields among ``fields``."""
+    return {field: dimension.names() for field, (_, dimension) in NAMED_FIELDS.items() if field in fields}
+
+
+def only_fields(rows, fields, names):
+    """Response rows with just ``fields``, names looked up in ``names``."""
+    return [
+        {
+            field: names[field].get(row[LIST_FIELDS[field]]) if field in names else row[field]
+            for field in fields
+        }
+        for row in rows
+    ]
+
+
+def rendered_response(request, body):
+    """Sends JSON rendered ahead of time as is; other formats get the data."""
+    if isinstance(request.accepted_renderer, ORJSONRenderer):
+        return HttpResponse(body, content_type=ORJSONRenderer.media_type)
+    return Response(orjson.loads(body))
 
 class CustomEmployeePagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count, is_estimate = count_employees(queryset, request.query_params)
+        self.django_paginator_class = partial(CountedPaginator, count=count, is_estimate=is_estimate)
+        return super().paginate_queryset(queryset, request, view)
     
     def get_paginated_response(self, data):
         return Response({
@@ -21,57 +127,225 @@ class CustomEmployeePagination(PageNumberPagination):
                 'previous': self.get_previous_link()
             },
             'count': self.page.paginator.count,
+            'count_is_estimate': self.page.paginator.is_estimate,
             'total_pages': self.page.paginator.num_pages,
             'current_page': self.page.number,
             'results': data
         })
 
 
+class EmployeeCursorPagination(BasePagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    def page_queryset(self, queryset, request):
+        """Narrows ``queryset`` to the rows needed for the requested page."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        reverse, position = self.decode_cursor(request)
+        self.reverse = reverse
+        self.position = position
+
+        if position is not None:
+            date_of_joining, pk = position
+            if reverse:
+                queryset = queryset.filter(date_of_joining__gte=date_of_joining).filter(
+                    Q(date_of_joining__gt=date_of_joining) | Q(id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(date_of_joining__lte=date_of_joining).filter(
+                    Q(date_of_joining__lt=date_of_joining) | Q(id__lt=pk)
+                )
+
+        if reverse:
+            queryset = queryset.order_by('date_of_joining', 'id')
+        else:
+            queryset = queryset.order_by('-date_of_joining', '-id')
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            date_of_joining = parse_date(payload['d'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if date_of_joining is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, (date_of_joining, pk)
+
+    def encode_cursor(self, row, reverse):
+        payload = {'d': row['date_of_joining'].isoformat(), 'i': row['id']}
+        if reverse:
+            payload['r'] = 1
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        next_cursor = self.get_next_cursor()
+        previous_cursor = self.get_previous_cursor()
+        return Response({
+            'links': {
+                'next': self.get_link(next_cursor),
+                'previous': self.get_link(previous_cursor)
+            },
+            'cursors': {
+                'next': next_cursor,
+                'previous': previous_cursor
+            },
+            'results': data
+        })
+
+
 class EmployeeListAPIView(APIView):
     pagination_class = CustomEmployeePagination
+    cursor_pagination_class = EmployeeCursorPagination
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+    cache_timeout = 60 * 15
+
+    def get_paginator(self, request):
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            return self.cursor_pagination_class()
+        return self.pagination_class()
     
-    @method_decorator(cache_page(60 * 15))
     def get(self, request):
-        cache_key = f"employee_list_{request.query_params.urlencode()}_page_{request.GET.get('page', 1)}"
-        
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-        
-        search_query = request.query_params.get('search', '')
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        department_id = request.query_params.get('department', None)
-        position_id = request.query_params.get('position', None)
+        fields = list_fields(request.query_params)
+        # The rendered body is cached, so hits skip both pickling and JSON encoding.
+        cache_key = build_cache_key('employee_list_body', request.query_params)
         
-        queryset = Employee.objects.select_related('department', 'position').values(
-            'id', 'first_name', 'last_name', 'email', 'date_of_joining','phone_number','salary',
-            department_name=F('department__name'),
-            position_title=F('position__title')
-        )
+        body = cache_get_or_build(cache_key, partial(self.render_page, request, fields), self.cache_timeout)
         
-        if search_query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) | 
-                Q(last_name__icontains=search_query) | 
-                Q(email__icontains=search_query) |
-                Q(department__name__icontains=search_query)
-            )
+        return rendered_response(request, body)
+
+    def render_page(self, request, fields):
+        queryset = employee_values(fields)
         
-        if start_date and end_date:
-            queryset = queryset.filter(date_of_joining__range=[start_date, end_date])
-            
-        if department_id:
-            queryset = queryset.filter(department_id=department_id)
-            
-        if position_id:
-            queryset = queryset.filter(position_id=position_id)
+        queryset = filter_employees(queryset, request.query_params)
         
         queryset = queryset.order_by('-date_of_joining')
         
-        paginator = self.pagination_class()
-        response_data = paginator.get_paginated_response(paginator.paginate_queryset(queryset, request)).data
-        
-        cache.set(cache_key, response_data, 60 * 15)
-        
-        return Response(response_data)
\ No newline at end of file
+        paginator = self.get_paginator(request)
+        page = paginator.paginate_queryset(queryset, request)
+        return render_json(paginator.get_paginated_response(only_fields(page, fields, field_names(fields))).data)
+
+class EmployeeStatsAPIView(APIView):
+    """
+    Headcount and salary figures per department and position plus monthly
+    joining trends, read from the summary views refreshed after each import.
+    """
+    cache_timeout = 60 * 15
+
+    def get(self, request):
+        cache_key = build_cache_key('employee_stats', request.query_params)
+
+        cached_data = cache_get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+
+        department_rows = DepartmentStats.objects.values(
+            'department_id', 'department_name', 'headcount', 'salary_total', 'salary_avg', 'salary_min', 'salary_max'
+        )
+        position_rows = PositionStats.objects.values(
+            'position_id', 'position_title', 'headcount', 'salary_total', 'salary_avg', 'salary_min', 'salary_max'
+        )
+        monthly_joinings = MonthlyJoiningStats.objects.values('month', 'headcount', 'salary_avg')
+
+        department = id_param(request.query_params, 'department')
+        if department is not None:
+            department_rows = department_rows.filter(department_id=department)
+
+        position = id_param(request.query_params, 'position')
+        if position is not None:
+            position_rows = position_rows.filter(position_id=position)
+
+        start_date = date_param(request.query_params, 'start_date')
+        if start_date:
+            monthly_joinings = monthly_joinings.filter(month__gte=start_date.replace(day=1))
+
+        end_date = date_param(request.query_params, 'end_date')
+        if end_date:
+            monthly_joinings = monthly_joinings.filter(month__lte=end_date)
+
+        # Totals cover the employees the department and position filters
+        # select. Neither summary view holds the two combined, so that case
+        # is counted from the employees table.
+        if department is not None and position is not None:
+            totals = Employee.objects.filter(department_id=department, position_id=position).aggregate(
+                headcount=Count('id'), salary_total=Sum('salary')
+            )
+        else:
+            totals = (position_rows if position is not None else department_rows).aggregate(
+                headcount=Sum('headcount'), salary_total=Sum('salary_total')
+            )
+        headcount = totals['headcount'] or 0
+        salary_total = totals['salary_total'] or 0
+
+        response_data = {
+            'totals': {
+                'headcount': headcount,
+                'salary_total': salary_total,
+                'salary_avg': round(salary_total / headcount, 2) if headcount else None,
+            },
+            'departments': list(department_rows),
+            'positions': list(position_rows),
+            'monthly_joinings': list(monthly_joinings),
+        }
+
+        cache.set(cache_key, response_data, self.cache_timeout)
+
+        return Response(response_data)